@@ -0,0 +1,197 @@
+import argparse
+import copy
+import json
+import logging
+import os
+import resource
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+import main
+
+'''
+Offline benchmark for the refresh pipeline
+
+Records real HKO/OpenWeatherMap payloads to fixture files once, then replays them through
+stand-ins for get_hko()/get_openweathermap() so fetch_data -> process_data -> draw_screen ->
+panel buffer conversion can be timed without network access or the e-ink panel.
+
+    python benchmark.py record                 # save live payloads as the 'default' fixture
+    python benchmark.py run --iterations 50    # time every scenario against that fixture
+
+Stress scenarios (many concurrent warnings, long warninginfo contents, typhoon signals) are
+derived from the recorded fixture, so they always match the live payload shapes.
+Run from the project directory - fonts, icons and settings.ini are loaded as in main.py.
+'''
+
+FIXTURE_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'benchmark_fixtures')
+
+# fetch_data() key -> fixture file name (the HKO dataType, or 'openweathermap')
+FIXTURE_FILES = main.FETCH_SOURCES
+
+# A spread of HKO warnsum entries, one per warning family, used by the stress scenarios
+STRESS_WARNINGS = {
+    'WFIRE': {'name': '火災危險警告', 'code': 'WFIRER', 'type': '紅色'},
+    'WFROST': {'name': '霜凍警告', 'code': 'WFROST'},
+    'WHOT': {'name': '酷熱天氣警告', 'code': 'WHOT'},
+    'WCOLD': {'name': '寒冷天氣警告', 'code': 'WCOLD'},
+    'WMSGNL': {'name': '強烈季候風信號', 'code': 'WMSGNL'},
+    'WRAIN': {'name': '暴雨警告信號', 'code': 'WRAINB', 'type': '黑色'},
+    'WFNTSA': {'name': '新界北部水浸特別報告', 'code': 'WFNTSA'},
+    'WL': {'name': '山泥傾瀉警告', 'code': 'WL'},
+    'WTCSGNL': {'name': '熱帶氣旋警告信號', 'code': 'TC8NE', 'type': '八號東北烈風或暴風信號'},
+    'WTMW': {'name': '海嘯警告', 'code': 'WTMW'},
+    'WTS': {'name': '雷暴警告', 'code': 'WTS'},
+}
+
+def record_fixture(settings, name):
+    """Fetch every endpoint live and save the raw payloads as fixture files."""
+    fixture_path = os.path.join(FIXTURE_DIR, name)
+    os.makedirs(fixture_path, exist_ok=True)
+    raw = main.fetch_data(dict(settings, cache_ttls={data_type: 0 for data_type in main.DEFAULT_CACHE_TTLS}))
+    # fetch_data() only keeps the parsed SunTable, so the SRS payload is saved as downloaded
+    raw['srs'] = json.loads(b''.join(main.stream_srs_payload(datetime.now().year, settings['timeouts']['SRS'])))
+    for key, file_name in FIXTURE_FILES.items():
+        with open(os.path.join(fixture_path, f"{file_name}.json"), 'w', encoding='utf-8') as file:
+            json.dump(raw[key], file, ensure_ascii=False)
+    print(f"Recorded {len(FIXTURE_FILES)} payloads to {fixture_path}")
+
+def load_fixture(name):
+    fixture_path = os.path.join(FIXTURE_DIR, name)
+    payloads = {}
+    for file_name in FIXTURE_FILES.values():
+        with open(os.path.join(fixture_path, f"{file_name}.json"), 'r', encoding='utf-8') as file:
+            payloads[file_name] = json.load(file)
+    return payloads
+
+def build_scenarios(payloads):
+    """Base fixture plus stress variants derived from it: name -> payloads."""
+    update_time = datetime.now().strftime('%Y-%m-%dT%H:%M:%S+08:00')
+
+    def with_warnings(base, codes):
+        scenario = copy.deepcopy(base)
+        scenario['warnsum'] = {code: dict(STRESS_WARNINGS[code], actionCode='ISSUE', issueTime=update_time, updateTime=update_time)
+                               for code in codes}
+        scenario['warninginfo'] = {'details': [{'warningStatementCode': code, 'contents': [f"{STRESS_WARNINGS[code]['name']}現正生效。"],
+                                                'updateTime': update_time} for code in codes]}
+        return scenario
+
+    many_warnings = with_warnings(payloads, list(STRESS_WARNINGS))
+    many_warnings['swt'] = {'swt': [{'desc': f"特別天氣提示 {i}: 預料本港天氣將會急速轉變。", 'updateTime': update_time} for i in range(5)]}
+
+    long_warninginfo = with_warnings(payloads, ['WRAIN', 'WTS'])
+    for detail in long_warninginfo['warninginfo']['details']:
+        detail['contents'] = ['天文台預料香港廣泛地區會受大雨影響，市民應留在安全地方，避免前往低窪地區及山坡，並留意電台及電視台廣播的最新消息。' * 3] * 30
+
+    typhoon = with_warnings(payloads, ['WTCSGNL', 'WRAIN'])
+    typhoon['warnsum']['WTCSGNL'].update(code='TC10', type='十號颶風信號')
+
+    return {
+        'base': payloads,
+        'many_warnings': many_warnings,
+        'long_warninginfo': long_warninginfo,
+        'typhoon': typhoon,
+    }
+
+def install_replay(payloads):
+    """Point main's fetchers at the fixture. Payloads are re-parsed from JSON text on every
+    call so the replay still pays the decode cost a live response would."""
+    encoded = {file_name: json.dumps(payload, ensure_ascii=False) for file_name, payload in payloads.items()}
+    main.get_hko = lambda data_type, language, ttl=0, timeout=None: json.loads(encoded[data_type])
+    main.get_openweathermap = lambda api_key, location, ttl=0, timeout=None: json.loads(encoded['openweathermap'])
+    main.get_sun_table = lambda year, timeout=None: main.parse_srs_stream(year, [encoded['SRS'].encode('utf-8')])
+
+def run_stages(settings, fonts, fill_color, dither):
+    """Run one full refresh and return {stage: elapsed seconds}. Render and buffer caches
+    are cleared first, so every iteration measures a cold frame."""
+    main._layer_cache.clear()
+    main._buffer_cache.clear()
+    timings = {}
+
+    start = time.perf_counter()
+    raw = main.fetch_data(settings)
+    timings['fetch_data'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processed = main.process_data(raw, settings)
+    timings['process_data'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    image = main.draw_screen(processed, fonts, settings, fill_color)
+    timings['draw_screen'] = time.perf_counter() - start
+
+    if main.np is not None:
+        start = time.perf_counter()
+        main.pack_panel_buffer(image, dither)
+        timings['panel_buffer'] = time.perf_counter() - start
+    return timings
+
+def measure_peak_memory(settings, fonts, fill_color, dither):
+    """Peak traced allocation per stage, from one separate pass - tracemalloc slows
+    everything down, so it is kept out of the timed iterations."""
+    peaks = {}
+    stage_calls = [
+        ('fetch_data', lambda state: state.update(raw=main.fetch_data(settings))),
+        ('process_data', lambda state: state.update(processed=main.process_data(state['raw'], settings))),
+        ('draw_screen', lambda state: state.update(image=main.draw_screen(state['processed'], fonts, settings, fill_color))),
+    ]
+    if main.np is not None:
+        stage_calls.append(('panel_buffer', lambda state: main.pack_panel_buffer(state['image'], dither)))
+
+    main._layer_cache.clear()
+    state = {}
+    tracemalloc.start()
+    for stage, call in stage_calls:
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.clear_traces()  # Python 3.8: also zeroes the peak, but forgets earlier stages' blocks
+        call(state)
+        peaks[stage] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peaks
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+def run_benchmark(settings, fonts, fixture, iterations, scenario_names, dither):
+    scenarios = build_scenarios(load_fixture(fixture))
+    print(f"{'scenario':<18}{'stage':<14}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}{'peak KiB':>10}")
+    for name in scenario_names:
+        install_replay(scenarios[name])
+        run_stages(settings, fonts, 'black', dither)  # warm-up: fonts, icons, thread pool
+        samples = {}
+        for _ in range(iterations):
+            for stage, elapsed in run_stages(settings, fonts, 'black', dither).items():
+                samples.setdefault(stage, []).append(elapsed * 1000)
+        peaks = measure_peak_memory(settings, fonts, 'black', dither)
+        for stage, values in samples.items():
+            print(f"{name:<18}{stage:<14}{percentile(values, 0.5):>9.2f}{percentile(values, 0.95):>9.2f}"
+                  f"{statistics.mean(values):>9.2f}{peaks[stage] / 1024:>10.0f}")
+    # tracemalloc only sees Python allocations; PIL's image buffers show up in the RSS peak
+    print(f"Process peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+
+def main_benchmark():
+    scenario_choices = ['base', 'many_warnings', 'long_warninginfo', 'typhoon']
+    parser = argparse.ArgumentParser(description='Record fixtures for, or run, the offline refresh benchmark.')
+    parser.add_argument('command', choices=['record', 'run'])
+    parser.add_argument('--fixture', default='default', help='Fixture name under benchmark_fixtures/')
+    parser.add_argument('--iterations', type=int, default=20, help='Timed iterations per scenario')
+    parser.add_argument('--scenario', choices=scenario_choices, action='append',
+                        help='Scenario to run (repeatable); defaults to all of them')
+    parser.add_argument('--no-dither', action='store_true', help='Time the undithered panel buffer conversion')
+    args = parser.parse_args()
+
+    main.logger.setLevel(logging.WARNING)  # per-stage info logs would swamp the report
+    settings = main.load_config()
+    if args.command == 'record':
+        record_fixture(settings, args.fixture)
+        return
+    fonts = main.load_fonts(settings)
+    run_benchmark(settings, fonts, args.fixture, args.iterations, args.scenario or scenario_choices, not args.no_dither)
+
+if __name__ == '__main__':
+    main_benchmark()
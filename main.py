@@ -2,12 +2,37 @@ import configparser
 import sys
 import os
 import time
-import textwrap
 import argparse
 import logging
+import json
+import hashlib
+import tempfile
+import threading
+import functools
+import contextlib
+import bisect
+import itertools
+import string
+import random
+import re
+import queue
+import io
+import mmap
+import math
+import struct
+from array import array
+from collections.abc import Mapping
+import resource
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import requests
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
 from datetime import datetime
 from PIL import Image, ImageDraw, ImageFont
+try:
+    import numpy as np
+except ImportError:  # optional - get_panel_buffer() falls back to Waveshare's epd.getbuffer()
+    np = None
 
 '''
 Weather Dashboard
@@ -41,6 +66,50 @@ FONT_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'static/font
 ICON_DIR_LARGE = './static/icon/large'
 ICON_DIR_SMALL = './static/icon/small'
 SMALL_ICON_SIZE = 56  # native assets are 65x65; scaled down a little for the new layout
+# Large icons are 150x150, but the alert-panel row only has 138px (74 to the divider at
+# 212) before it collides with the badges row below - scale down to fit.
+HERO_ICON_SIZE = 130
+ICON_CACHE_SIZE = 64  # decoded + scaled icons kept in memory (hero, tiles, 7-day codes)
+TEXT_MEASURE_CACHE_SIZE = 2048  # (text, font) measurements kept across frames
+LAYOUT_CACHE_SIZE = 128  # computed panel layouts, one per distinct set of strings
+GLYPH_CACHE_SIZE = 4096  # per-(character, font) advance widths used for wrapping
+# Closing punctuation that must not begin a wrapped line; it stays with the preceding character
+NO_LINE_START_CHARS = frozenset('，。、：；！？）」』》〉】,.:;!?)%')
+CACHE_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'cache')
+# Hash of this file, part of every frame fingerprint - a saved boot frame or server ETag
+# from before a deploy that changed the drawing code never matches a fresh render
+with open(__file__, 'rb') as _source:
+    RENDER_VERSION = hashlib.sha1(_source.read()).hexdigest()[:12]
+
+# Seconds a cached API response is reused without contacting the server at all, per
+# dataType. 0 means revalidate every time (still cheap when the server answers 304).
+# Override any of these with cache_ttl_<datatype> in settings.ini.
+DEFAULT_CACHE_TTLS = {
+    'flw': 1800,
+    'rhrread': 0,
+    'SRS': 7 * 24 * 3600,  # one request covers the whole year
+    'fnd': 3600,
+    'warnsum': 0,
+    'warninginfo': 0,
+    'swt': 0,
+    'openweathermap': 600,
+}
+
+# Layout
+SHIFT_RIGHT = 17
+LEFT_COL_X = 26
+LEFT_COL_WIDTH = 388
+DIVIDER_X = 430
+RIGHT_COL_X = 452
+RIGHT_COL_RIGHT = DISPLAY_WIDTH - 26  # 774
+
+# Sunrise/Sunset/Wind/Humidity tiles: (icon, label, unit, icon position, label position, value center x)
+WEATHER_TILES = (
+    ('sunset.bmp', '日落', None, (RIGHT_COL_X, 82), (RIGHT_COL_X + 90, 93), RIGHT_COL_X + 80 + SHIFT_RIGHT),
+    ('sunrise.bmp', '日出', None, (RIGHT_COL_X + 182, 82), (RIGHT_COL_X + 272, 93), RIGHT_COL_X + 262 + SHIFT_RIGHT),
+    ('wind.bmp', '風速', 'm/s', (RIGHT_COL_X, 168), (RIGHT_COL_X + 90, 179), RIGHT_COL_X + 80 + SHIFT_RIGHT),
+    ('humidity.bmp', '濕度', '%', (RIGHT_COL_X + 182, 168), (RIGHT_COL_X + 272, 179), RIGHT_COL_X + 262 + SHIFT_RIGHT),
+)
 
 # Colors - matches the epd7in3e 6-color e-ink panel's palette exactly, so the
 # DEV preview (image.show()) renders identically to what the panel quantizes to.
@@ -51,80 +120,1086 @@ COLOR_RED = (255, 0, 0)
 COLOR_BLUE = (0, 0, 255)
 COLOR_GREEN = (0, 255, 0)
 
-# Keyword -> badge color for warning pills, checked in priority order (most severe first)
-WARNING_BADGE_BLACK_KEYWORDS = ('黑色', '十號', '九號', '霜凍')
-WARNING_BADGE_RED_KEYWORDS = ('紅色', '八號', '海嘯', '寒冷')
-WARNING_BADGE_YELLOW_KEYWORDS = ('黃色', '一號', '三號')
+# epd7in3e palette order - a pixel's index is the 4-bit value the panel expects. Index 4 is
+# unused by the panel and padded with black, same as Waveshare's getbuffer() palette.
+PANEL_PALETTE = (COLOR_BLACK, COLOR_WHITE, COLOR_YELLOW, COLOR_RED, COLOR_BLACK, COLOR_BLUE, COLOR_GREEN)
+
 # Label substituted when HKO reports nothing active - matched exactly (not by keyword) so
 # it can claim green while blue stays the tier for real-but-unclassified warnings.
 NO_WARNINGS_LABEL = '沒有天氣警告'
+# Every HKO warning and signal: (warnsum subtype code, Chinese label as process_warning_data()
+# builds it, badge color, hero icon or None). Classification is one lookup by code, which
+# holds in every language; the label only classifies items that come without a code.
+WARNING_CATALOGUE = (
+    ('TC1', '一號戒備信號', COLOR_YELLOW, 'T1.bmp'),
+    ('TC3', '三號強風信號', COLOR_YELLOW, 'T3.bmp'),
+    ('WTCPRE8', '預警八號熱帶氣旋警告信號的特別報告', COLOR_RED, None),
+    ('TC8NE', '八號東北烈風或暴風信號', COLOR_RED, 'T8NE.bmp'),
+    ('TC8SE', '八號東南烈風或暴風信號', COLOR_RED, 'T8SE.bmp'),
+    ('TC8SW', '八號西南烈風或暴風信號', COLOR_RED, 'T8SW.bmp'),
+    ('TC8NW', '八號西北烈風或暴風信號', COLOR_RED, 'T8NW.bmp'),
+    ('TC9', '九號烈風或暴風風力增強信號', COLOR_BLACK, 'T9.bmp'),
+    ('TC10', '十號颶風信號', COLOR_BLACK, 'T10.bmp'),
+    ('WRAINA', '黃色暴雨警告信號', COLOR_YELLOW, 'AmberRainstorm.bmp'),
+    ('WRAINR', '紅色暴雨警告信號', COLOR_RED, 'RedRainstorm.bmp'),
+    ('WRAINB', '黑色暴雨警告信號', COLOR_BLACK, 'BlackRainstorm.bmp'),
+    ('WFIREY', '黃色火災危險警告', COLOR_YELLOW, None),
+    ('WFIRER', '紅色火災危險警告', COLOR_RED, None),
+    ('WFROST', '霜凍警告', COLOR_BLACK, None),
+    ('WTMW', '海嘯警告', COLOR_RED, None),
+    ('WCOLD', '寒冷天氣警告', COLOR_RED, None),
+    ('WHOT', '酷熱天氣警告', COLOR_BLUE, None),
+    ('WMSGNL', '強烈季候風信號', COLOR_BLUE, None),
+    ('WL', '山泥傾瀉警告', COLOR_BLUE, None),
+    ('WFNTSA', '新界北部水浸特別報告', COLOR_BLUE, None),
+    ('WTS', '雷暴警告', COLOR_BLUE, None),
+    ('SWT', '特別天氣提示', COLOR_BLUE, None),
+    (None, NO_WARNINGS_LABEL, COLOR_GREEN, None),
+)
+# Code -> (badge color, hero icon) and label -> (badge color, hero icon), built once from the catalogue
+WARNING_CODE_INDEX = {code: (color, icon) for code, _, color, icon in WARNING_CATALOGUE if code}
+WARNING_LABEL_INDEX = {label: (color, icon) for _, label, color, icon in WARNING_CATALOGUE}
+# Fallback for labels missing from the catalogue (new warning types, other languages):
+# severity keywords, checked most severe first
+WARNING_KEYWORD_PATTERNS = (
+    (COLOR_BLACK, re.compile('黑色|十號|九號|霜凍')),
+    (COLOR_RED, re.compile('紅色|八號|海嘯|寒冷')),
+    (COLOR_YELLOW, re.compile('黃色|一號|三號')),
+)
+# Overall severity, most severe first - also the order get_overall_warning_color() checks in
+WARNING_SEVERITY_ORDER = (COLOR_BLACK, COLOR_RED, COLOR_YELLOW, COLOR_BLUE, COLOR_GREEN)
+
+# How often HKO publishes each dataset the scheduler tracks, in seconds, until enough
+# updateTimes have been seen to learn the real cadence. Override with publish_cadence_<datatype>.
+DEFAULT_PUBLISH_CADENCES = {
+    'rhrread': 3600,  # hourly, a couple of minutes past the hour
+    'flw': 6 * 3600,
+    'fnd': 12 * 3600,
+}
+# fetch_data() key -> the HKO dataType it holds, or 'openweathermap'
+FETCH_SOURCES = {
+    'local_forecast': 'flw',
+    'local_weather': 'rhrread',
+    'srs': 'SRS',
+    'nine_day_forecast': 'fnd',
+    'warning_summary': 'warnsum',
+    'warning_info': 'warninginfo',
+    'special_weather': 'swt',
+    'openweathermap': 'openweathermap',
+}
+OPENWEATHERMAP_LOCATION = 'HongKong'
+# fetch_data() key holding each tracked dataset
+SCHEDULED_DATASETS = {'rhrread': 'local_weather', 'flw': 'local_forecast', 'fnd': 'nine_day_forecast'}
+
+# Shared HTTP session - fetch_data() runs all endpoint calls in parallel, and reusing
+# keep-alive connections saves a TLS handshake to data.weather.gov.hk per request.
+FETCH_POOL_SIZE = 8
+# Per-request (connect, read) timeouts in seconds; overridable per dataType in settings.ini
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 20
+http_session = requests.Session()
+http_session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=FETCH_POOL_SIZE))
+http_session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=FETCH_POOL_SIZE))
 
 # Load Configuration
 def load_config():
-    config = configparser.ConfigParser()
     try:
-        with open(CONFIG_FILE, 'r') as file:
-            logger.info(f"Loading configuration from {CONFIG_FILE}...")
-        config.read(CONFIG_FILE, encoding='utf-8')
-        settings = {k: v for k, v in config.items('Settings')}
-        settings['max_lines'] = int(settings['max_lines'])
-        settings['refresh_seconds'] = int(settings['refresh_seconds'])
+        settings = read_config()
         logger.info("Configuration loaded successfully.")
         return settings
     except Exception as e:
         logger.exception("Config error:")
         sys.exit(1)
 
+def read_config():
+    """Read and convert settings.ini; raises on a missing file or a bad value."""
+    config = configparser.ConfigParser()
+    with open(CONFIG_FILE, 'r') as file:
+        logger.info(f"Loading configuration from {CONFIG_FILE}...")
+    config.read(CONFIG_FILE, encoding='utf-8')
+    raw_settings = {k: v for k, v in config.items('Settings')}
+    settings = parse_settings(dict(raw_settings))
+    # [Panel:<name>] sections override [Settings] for one panel rendered in SERVER mode
+    settings['panels'] = {section.split(':', 1)[1].strip(): parse_settings(dict(raw_settings, **dict(config.items(section))))
+                          for section in config.sections() if section.startswith('Panel:')}
+    return settings
+
+def get_config_mtime():
+    try:
+        return os.stat(CONFIG_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+def reload_config(settings):
+    """Re-read settings.ini after an edit. Returns (new settings, changed keys), or the
+    current settings and no changes if the edited file doesn't parse."""
+    try:
+        new_settings = read_config()
+    except Exception:
+        logger.exception(f"{CONFIG_FILE} changed but could not be loaded, keeping the current settings:")
+        return settings, set()
+    changed = {key for key in settings.keys() | new_settings.keys() if settings.get(key) != new_settings.get(key)}
+    return new_settings, changed
+
+def parse_settings(settings):
+    """Convert the raw string values of a settings section in place."""
+    settings['max_lines'] = int(settings['max_lines'])
+    settings['refresh_seconds'] = int(settings['refresh_seconds'])
+    settings['warning_poll_seconds'] = int(settings.get('warning_poll_seconds', 60))
+    settings['dither'] = settings.get('dither', 'true').lower() == 'true'
+    settings['metrics_port'] = int(settings.get('metrics_port', 0))
+    settings['use_subset_fonts'] = settings.get('use_subset_fonts', 'false').lower() == 'true'
+    settings['min_refresh_seconds'] = int(settings.get('min_refresh_seconds', 120))
+    settings['publish_grace_seconds'] = int(settings.get('publish_grace_seconds', 120))
+    settings['quiet_hours'] = parse_quiet_hours(settings.get('quiet_hours', ''))
+    settings['publish_cadences'] = {data_type: int(settings[f'publish_cadence_{data_type}'])
+                                    for data_type in DEFAULT_PUBLISH_CADENCES if f'publish_cadence_{data_type}' in settings}
+    settings['icon_atlas'] = settings.get('icon_atlas', 'true').lower() == 'true'
+    settings['cache_ttls'] = {data_type: int(settings.get(f'cache_ttl_{data_type.lower()}', ttl))
+                              for data_type, ttl in DEFAULT_CACHE_TTLS.items()}
+    connect_timeout = float(settings.get('connect_timeout', DEFAULT_CONNECT_TIMEOUT))
+    read_timeout = float(settings.get('read_timeout', DEFAULT_READ_TIMEOUT))
+    settings['timeouts'] = {data_type: (float(settings.get(f'connect_timeout_{data_type.lower()}', connect_timeout)),
+                                        float(settings.get(f'read_timeout_{data_type.lower()}', read_timeout)))
+                            for data_type in DEFAULT_CACHE_TTLS}
+    settings['fetch_deadline_seconds'] = float(settings.get('fetch_deadline_seconds', 45))
+    settings['server_port'] = int(settings.get('server_port', 8080))
+    settings['render_workers'] = int(settings.get('render_workers', 2))
+    settings['client_poll_seconds'] = int(settings.get('client_poll_seconds', 60))
+    settings['show_trend'] = settings.get('show_trend', 'false').lower() == 'true'
+    settings['render_mode'] = settings.get('render_mode', 'rgb').lower()
+    if settings['render_mode'] not in ('rgb', 'palette'):
+        raise ValueError(f"render_mode must be 'rgb' or 'palette', not {settings['render_mode']!r}")
+    settings['observations_capacity'] = int(settings.get('observations_capacity', 8192))
+    settings['observations_flush_records'] = int(settings.get('observations_flush_records', 12))
+    return settings
+
 # Load Fonts
+# Font key -> (settings.ini entry naming the TTF file, point size)
+FONT_SPECS = {
+    'bold': ('bold_font', 39),
+    'normal': ('normal_font', 20),
+    'large': ('bold_font', 30),
+    'light': ('light_font', 15),
+    'chinese_bold': ('chinese_bold_font', 14),
+    'chinese_normal': ('chinese_normal_font', 14),
+    'chinese_light': ('chinese_light_font', 14),
+    'chinese_light_large': ('chinese_light_font', 17),
+    'small_text': ('normal_font', 11),
+    'top_right_value': ('bold_font', 20),
+    'unit': ('normal_font', 11),
+    'current_temp': ('bold_font', 87),
+    'degree_celsius': ('bold_font', 40),
+    'chinese_forecast': ('chinese_bold_font', 11),
+    'forecast_text': ('normal_font', 11),
+    'last_update': ('chinese_normal_font', 11)
+}
+# The font keys draw_screen() uses - what warm-up opens ahead of the first frame. The rest
+# of FONT_SPECS stays unopened unless something looks it up.
+FRAME_FONT_KEYS = ('normal', 'large', 'chinese_bold', 'chinese_normal', 'chinese_light_large', 'small_text',
+                   'top_right_value', 'unit', 'current_temp', 'degree_celsius', 'chinese_forecast',
+                   'forecast_text', 'last_update')
+# Settings that decide which face each font key opens
+FONT_SETTINGS = {setting for setting, _ in FONT_SPECS.values()} | {'use_subset_fonts'}
+# The CJK faces - the only ones large enough to be worth subsetting
+CJK_FONT_SETTINGS = ('chinese_bold_font', 'chinese_normal_font', 'chinese_light_font')
+FONT_SUBSET_DIR = 'subset'  # under FONT_DIR, written by --subset-fonts
+
 def load_fonts(settings):
     logger.info("Loading fonts...")
-    fonts = {
-        'bold': ImageFont.truetype(os.path.join(FONT_DIR, settings['bold_font']), 39),
-        'normal': ImageFont.truetype(os.path.join(FONT_DIR, settings['normal_font']), 20),
-        'large': ImageFont.truetype(os.path.join(FONT_DIR, settings['bold_font']), 30),
-        'light': ImageFont.truetype(os.path.join(FONT_DIR, settings['light_font']), 15),
-        'chinese_bold': ImageFont.truetype(os.path.join(FONT_DIR, settings['chinese_bold_font']), 14),
-        'chinese_normal': ImageFont.truetype(os.path.join(FONT_DIR, settings['chinese_normal_font']), 14),
-        'chinese_light': ImageFont.truetype(os.path.join(FONT_DIR, settings['chinese_light_font']), 14),
-        'chinese_light_large': ImageFont.truetype(os.path.join(FONT_DIR, settings['chinese_light_font']), 17),
-        'small_text': ImageFont.truetype(os.path.join(FONT_DIR, settings['normal_font']), 11),
-        'top_right_value': ImageFont.truetype(os.path.join(FONT_DIR, settings['bold_font']), 20),
-        'unit': ImageFont.truetype(os.path.join(FONT_DIR, settings['normal_font']), 11),
-        'current_temp': ImageFont.truetype(os.path.join(FONT_DIR, settings['bold_font']), 87),
-        'degree_celsius': ImageFont.truetype(os.path.join(FONT_DIR, settings['bold_font']), 40),
-        'chinese_forecast': ImageFont.truetype(os.path.join(FONT_DIR, settings['chinese_bold_font']), 11),
-        'forecast_text': ImageFont.truetype(os.path.join(FONT_DIR, settings['normal_font']), 11),
-        'last_update': ImageFont.truetype(os.path.join(FONT_DIR, settings['chinese_normal_font']), 11)
-    }
-    logger.info("Fonts loaded successfully.")
+    fonts = FontRegistry(settings)
+    logger.info("Fonts registered; each face loads on first use.")
     return fonts
 
+class FontRegistry(Mapping):
+    """Read-only fonts mapping that opens each face the first time it is looked up.
+
+    Faces are shared through get_font(), so keys with the same file and size (e.g. 'unit',
+    'small_text' and 'forecast_text') are one FreeType object. FreeType memory-maps fonts it
+    opens by path, so several sizes of one CJK file also share its pages rather than each
+    holding a copy. With use_subset_fonts, the CJK faces come from FONT_DIR/subset when
+    --subset-fonts has produced them.
+    """
+
+    def __init__(self, settings):
+        self.paths = {key: get_font_path(settings, setting) for key, (setting, _) in FONT_SPECS.items()}
+        self.loaded = {}
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        font = self.loaded.get(key)
+        if font is None:
+            with self.lock:
+                font = self.loaded.get(key)
+                if font is None:
+                    font = get_font(self.paths[key], FONT_SPECS[key][1])
+                    self.loaded[key] = font
+        return font
+
+    def __iter__(self):
+        return iter(FONT_SPECS)
+
+    def __len__(self):
+        return len(FONT_SPECS)
+
+def get_font_path(settings, setting):
+    path = os.path.join(FONT_DIR, settings[setting])
+    if settings['use_subset_fonts'] and setting in CJK_FONT_SETTINGS:
+        subset_path = os.path.join(FONT_DIR, FONT_SUBSET_DIR, settings[setting])
+        if os.path.exists(subset_path):
+            return subset_path
+    return path
+
+@functools.lru_cache(maxsize=None)
+def get_font(path, size):
+    logger.debug(f"Loading font {os.path.basename(path)} at {size}pt")
+    return ImageFont.truetype(path, size)
+
+def subset_fonts(settings):
+    """Build glyph subsets of the CJK fonts in FONT_DIR/subset.
+
+    Keeps every character seen in the cached HKO responses, every non-ASCII character in
+    this file (labels like 日出/體感温度, warning names) and printable ASCII. Re-run it after
+    the cache has seen a while of real data, then set use_subset_fonts = true.
+    Needs fontTools (pip install fonttools).
+    """
+    try:
+        from fontTools import subset
+    except ImportError:
+        logger.error("--subset-fonts needs fontTools: pip install fonttools")
+        sys.exit(1)
+
+    glyphs = set(string.printable) | set('…°')
+    with open(os.path.abspath(__file__), 'r', encoding='utf-8') as file:
+        glyphs.update(char for char in file.read() if not char.isascii())
+    for entry_name in os.listdir(CACHE_DIR) if os.path.isdir(CACHE_DIR) else []:
+        if entry_name.endswith('.json'):
+            entry = read_cache_entry(os.path.join(CACHE_DIR, entry_name))
+            glyphs.update(collect_text(entry['data'] if entry else None))
+    text = ''.join(sorted(glyphs))
+
+    os.makedirs(os.path.join(FONT_DIR, FONT_SUBSET_DIR), exist_ok=True)
+    options = subset.Options()
+    for font_file in sorted({settings[setting] for setting in CJK_FONT_SETTINGS}):
+        source_path = os.path.join(FONT_DIR, font_file)
+        target_path = os.path.join(FONT_DIR, FONT_SUBSET_DIR, font_file)
+        font = subset.load_font(source_path, options)
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(text=text)
+        subsetter.subset(font)
+        subset.save_font(font, target_path, options)
+        logger.info(f"Subset {font_file} to {len(text)} characters: "
+                    f"{os.path.getsize(source_path) // 1024} KiB -> {os.path.getsize(target_path) // 1024} KiB")
+
+def collect_text(value):
+    """Every character in the strings of a decoded JSON value."""
+    if isinstance(value, str):
+        return set(value)
+    if isinstance(value, dict):
+        return set().union(*(collect_text(item) for item in value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*(collect_text(item) for item in value)) if value else set()
+    return set()
+
 # Fetch Data
-def fetch_data(settings):
+def fetch_data(settings, cycle=None, revalidate=()):
+    """Fetch every endpoint in parallel; cycle latency is roughly that of the slowest one.
+
+    Datasets in revalidate (dataTypes the scheduler expects a new publish of) skip their
+    cache TTL, so the cycle woken for a publish actually asks HKO for it.
+
+    The whole stage is bounded by fetch_deadline_seconds: endpoints still outstanding then
+    are treated as failed (and fall back to cached data below) while their requests run
+    out their own timeouts in the background. If a cycle metrics dict is passed,
+    per-endpoint durations, failures and deadline hits are recorded in it.
+    """
     logger.info('Fetching data from APIs...')
-    data = {
-        'local_forecast': get_hko('flw', settings['language']),
-        'local_weather': get_hko('rhrread', settings['language']),
-        'srs': get_hko('SRS', settings['language']),
-        'nine_day_forecast': get_hko('fnd', settings['language']),
-        'warning_summary': get_hko('warnsum', settings['language']),
-        'warning_info': get_hko('warninginfo', settings['language']),
-        'special_weather': get_hko('swt', settings['language']),
-        'openweathermap': get_openweathermap(settings['openweathermap_apikey'], 'HongKong')
-    }
-    logger.info('Data fetched successfully.')
+    language = settings['language']
+    timeouts = settings['timeouts']
+    ttls = {data_type: 0 if data_type in revalidate else ttl for data_type, ttl in settings['cache_ttls'].items()}
+    jobs = {}
+    for key, data_type in FETCH_SOURCES.items():
+        if data_type == 'openweathermap':
+            jobs[key] = (get_openweathermap, settings['openweathermap_apikey'], OPENWEATHERMAP_LOCATION, ttls[data_type], timeouts[data_type])
+        elif data_type == 'SRS':
+            jobs[key] = (get_sun_table, datetime.now().year, timeouts[data_type])
+        else:
+            jobs[key] = (get_hko, data_type, language, ttls[data_type], timeouts[data_type])
+    data, timings, errors = {'stale': {}}, {}, {}
+    # Not a with-block: leaving one waits for every worker, which is what the deadline avoids
+    executor = ThreadPoolExecutor(max_workers=min(len(jobs), FETCH_POOL_SIZE))
+    futures = {key: executor.submit(timed_call, func, *args) for key, (func, *args) in jobs.items()}
+    wait(futures.values(), timeout=settings['fetch_deadline_seconds'])
+    deadline_hits = []
+    for key, future in futures.items():
+        if not future.done():
+            future.cancel()
+            deadline_hits.append(key)
+            errors[key] = TimeoutError(f"no response within the {settings['fetch_deadline_seconds']:g}s fetch deadline")
+            continue
+        try:
+            data[key], timings[key] = future.result()
+        except Exception as e:
+            errors[key] = e
+    executor.shutdown(wait=False)
+    if cycle is not None:
+        cycle['endpoints'].update(timings)
+        cycle['errors'].extend(errors)
+        cycle['deadline_hits'].extend(deadline_hits)
+
+    # Stale-while-error: an endpoint that failed falls back to its last good response, so
+    # one outage costs only that panel's freshness. Only a source never fetched before
+    # still fails the cycle.
+    for key, error in errors.items():
+        if FETCH_SOURCES[key] == 'SRS':
+            # No table for this year yet (first boot, or 1 January) - the times stay blank
+            # rather than blanking the whole cycle
+            data[key] = SunTable(datetime.now().year)
+            data['stale'][key] = math.inf
+            logger.warning(f"Fetching {key} failed ({error}); sunrise/sunset stay blank until it succeeds.")
+            continue
+        entry = read_cache_entry(get_cache_path(get_source_url(FETCH_SOURCES[key], settings)))
+        if entry is None:
+            raise error
+        data[key] = entry['data']
+        data['stale'][key] = time.time() - entry['fetched_at']
+        logger.warning(f"Fetching {key} failed ({error}); using last good data from {data['stale'][key] / 60:.0f} minutes ago.")
+    timing_text = ', '.join(f"{key}={elapsed:.2f}s" for key, elapsed in timings.items())
+    logger.info(f"Data fetched in {max(timings.values(), default=0):.2f}s ({timing_text}).")
     return data
 
+# Warning Watcher
+class WarningWatcher(threading.Thread):
+    """Polls only the warning endpoints, between full refresh cycles.
+
+    Every warning_poll_seconds it fetches warnsum/warninginfo/swt (revalidated through the
+    response cache, so an unchanged feed costs three 304s) and compares the result with the
+    warnings and warning details the main loop last rendered. Any difference sets
+    wake_event, which cuts the main loop's sleep short instead of leaving a new warning up
+    to refresh_seconds late.
+    """
+
+    def __init__(self, settings, wake_event):
+        super().__init__(name='warning-watcher', daemon=True)
+        self.language = settings['language']
+        self.interval = settings['warning_poll_seconds']
+        self.timeouts = settings['timeouts']
+        self.wake_event = wake_event
+        self.lock = threading.Lock()
+        self.rendered_items = None
+        self.rendered_info = None
+        self.rendered_codes = {}
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def set_rendered(self, warnsum_items, warninfo_items, warning_codes=None):
+        """Record the warnings currently on the panel (labels and details) as the baseline to compare against."""
+        with self.lock:
+            self.rendered_items = dict(warnsum_items)
+            self.rendered_info = dict(warninfo_items) if warninfo_items is not None else None
+            self.rendered_codes = dict(warning_codes or {})
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                warnsum_items, warninfo_items, warning_codes = process_warning_data(
+                    get_hko('warnsum', self.language, timeout=self.timeouts['warnsum']),
+                    get_hko('warninginfo', self.language, timeout=self.timeouts['warninginfo']),
+                    get_hko('swt', self.language, timeout=self.timeouts['swt']))
+            except Exception:
+                logger.warning('Warning watcher poll failed.', exc_info=True)
+                continue
+            # Defaulted as in process_data(), so an unchanged feed compares equal
+            warnsum_items = warnsum_items or {'1': NO_WARNINGS_LABEL}
+            warninfo_items = warninfo_items or {'1': [NO_WARNINGS_LABEL]}
+            with self.lock:
+                rendered_items, rendered_info, rendered_codes = self.rendered_items, self.rendered_info, self.rendered_codes
+            if rendered_items is None:
+                continue
+            change = describe_warning_change(rendered_items, warnsum_items, dict(rendered_codes, **warning_codes))
+            if not change and rendered_info is not None and warninfo_items != rendered_info:
+                change = 'details updated'
+            if change:
+                logger.info(f"Warnings changed ({change}), triggering an immediate refresh.")
+                self.set_rendered(warnsum_items, warninfo_items, warning_codes)
+                self.wake_event.set()
+
+# Scheduler
+class RefreshScheduler:
+    """Decides how long the main loop sleeps between refresh cycles.
+
+    Tracks the updateTime of rhrread/flw/fnd and wakes publish_grace_seconds after the
+    next update of any of them is due, instead of a fixed refresh_seconds. Cadences start
+    from DEFAULT_PUBLISH_CADENCES (or publish_cadence_<datatype>) and, unless configured,
+    are replaced by the median interval actually observed. The delay always stays between
+    min_refresh_seconds and refresh_seconds. Failures back off exponentially with jitter,
+    and nothing is scheduled inside quiet_hours.
+    """
+
+    LEARN_AFTER = 3  # observed publish intervals needed before trusting the learned cadence
+    FAILURE_BASE_SECONDS = 30
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.last_update = {}
+        self.intervals = {data_type: [] for data_type in DEFAULT_PUBLISH_CADENCES}
+        self.failures = 0
+
+    def observe(self, raw):
+        """Record the updateTime of each tracked dataset from a successful fetch."""
+        self.failures = 0
+        for data_type, key in SCHEDULED_DATASETS.items():
+            update_time = (raw.get(key) or {}).get('updateTime')
+            if not update_time:
+                continue
+            try:
+                updated_at = datetime.fromisoformat(update_time).timestamp()
+            except ValueError:
+                continue
+            previous = self.last_update.get(data_type)
+            if previous is not None and updated_at > previous:
+                self.intervals[data_type] = (self.intervals[data_type] + [updated_at - previous])[-8:]
+            self.last_update[data_type] = updated_at
+
+    def cadence(self, data_type):
+        configured = self.settings['publish_cadences'].get(data_type)
+        if configured:
+            return configured
+        if len(self.intervals[data_type]) >= self.LEARN_AFTER:
+            return min(max(statistics.median(self.intervals[data_type]), 600), 86400)
+        return DEFAULT_PUBLISH_CADENCES[data_type]
+
+    def due_datasets(self, now=None):
+        """dataTypes whose next publish is already due, so a cached copy is known to be old."""
+        now = time.time() if now is None else now
+        return {data_type for data_type, updated_at in self.last_update.items()
+                if updated_at + self.cadence(data_type) <= now}
+
+    def next_delay(self, now=None):
+        """Seconds until the next cycle should start after a successful one."""
+        now = time.time() if now is None else now
+        min_delay, max_delay = self.settings['min_refresh_seconds'], self.settings['refresh_seconds']
+        candidates = [max_delay]
+        for data_type, updated_at in self.last_update.items():
+            due = updated_at + self.cadence(data_type) + self.settings['publish_grace_seconds']
+            if due > now:
+                candidates.append(due - now)
+            else:
+                # Late - retry, but back off the longer it stays late rather than hammering HKO
+                candidates.append(now - due)
+        delay = min(max(min(candidates), min_delay), max_delay)
+        return self.skip_quiet_hours(now, delay)
+
+    def failure_delay(self, now=None):
+        """Seconds to wait after a failed cycle: exponential backoff with jitter."""
+        now = time.time() if now is None else now
+        self.failures += 1
+        backoff = min(self.FAILURE_BASE_SECONDS * 2 ** (self.failures - 1), self.settings['refresh_seconds'])
+        return self.skip_quiet_hours(now, backoff / 2 + random.uniform(0, backoff / 2))
+
+    def skip_quiet_hours(self, now, delay):
+        """Push a wake-up that would land inside quiet_hours to the end of them."""
+        quiet_hours = self.settings['quiet_hours']
+        if not quiet_hours:
+            return delay
+        wake = datetime.fromtimestamp(now + delay)
+        minute_of_day = wake.hour * 60 + wake.minute
+        start, end = quiet_hours
+        quiet = start <= minute_of_day < end if start < end else minute_of_day >= start or minute_of_day < end
+        if not quiet:
+            return delay
+        minutes_left = (end - minute_of_day) % (24 * 60)
+        return delay + minutes_left * 60 - wake.second
+
+def parse_quiet_hours(value):
+    """'23:00-06:30' -> (start, end) in minutes of the day, or None if unset."""
+    if not value.strip():
+        return None
+    start, end = (datetime.strptime(part.strip(), '%H:%M') for part in value.split('-'))
+    return start.hour * 60 + start.minute, end.hour * 60 + end.minute
+
+# Metrics
+class MetricsExporter:
+    """Exports per-cycle timings and resource usage for tracking a fleet of devices.
+
+    Each finished cycle is appended to metrics_jsonl as one JSON line. The totals are
+    written to metrics_textfile in Prometheus text format (for node_exporter's textfile
+    collector) and served at /metrics on metrics_port. Each output is off unless configured.
+    """
+
+    def __init__(self, settings):
+        self.jsonl_path = settings.get('metrics_jsonl') or None
+        self.textfile_path = settings.get('metrics_textfile') or None
+        self.port = settings['metrics_port']
+        self.lock = threading.Lock()
+        # record() runs on the render, display and main threads; this keeps their file
+        # writes whole and in order without holding up /metrics scrapes behind disk I/O
+        self.write_lock = threading.Lock()
+        self.last_cycle = None
+        self.cycles_total = self.skipped_total = self.failed_total = 0
+        self.endpoint_errors = {}
+        self.deadline_hits = {}
+
+    def start(self):
+        if not self.port:
+            return
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep scrapes out of the dashboard log
+
+        server = ThreadingHTTPServer(('', self.port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        logger.info(f"Serving Prometheus metrics on port {self.port}.")
+
+    def record(self, cycle):
+        """Fold one finished cycle into the totals and write it out."""
+        cycle['rss_bytes'] = get_rss_bytes()
+        with self.lock:
+            self.last_cycle = cycle
+            self.cycles_total += 1
+            self.skipped_total += cycle['skipped']
+            self.failed_total += cycle['failed']
+            for endpoint in cycle['errors']:
+                self.endpoint_errors[endpoint] = self.endpoint_errors.get(endpoint, 0) + 1
+            for endpoint in cycle['deadline_hits']:
+                self.deadline_hits[endpoint] = self.deadline_hits.get(endpoint, 0) + 1
+        with self.write_lock:
+            try:
+                if self.jsonl_path:
+                    with open(self.jsonl_path, 'a', encoding='utf-8') as file:
+                        file.write(json.dumps(cycle, ensure_ascii=False) + '\n')
+                if self.textfile_path:
+                    # node_exporter may read at any moment - write beside the target, then rename
+                    temp_path = f"{self.textfile_path}.tmp"
+                    with open(temp_path, 'w', encoding='utf-8') as file:
+                        file.write(self.render_prometheus())
+                    os.replace(temp_path, self.textfile_path)
+            except OSError:
+                logger.warning('Could not write metrics.', exc_info=True)
+
+    def render_prometheus(self):
+        with self.lock:
+            cycle = self.last_cycle
+            lines = [
+                '# HELP weather_dashboard_cycles_total Refresh cycles run.',
+                '# TYPE weather_dashboard_cycles_total counter',
+                f"weather_dashboard_cycles_total {self.cycles_total}",
+                '# HELP weather_dashboard_cycles_skipped_total Cycles whose display refresh was skipped as unchanged.',
+                '# TYPE weather_dashboard_cycles_skipped_total counter',
+                f"weather_dashboard_cycles_skipped_total {self.skipped_total}",
+                '# HELP weather_dashboard_cycles_failed_total Cycles that ended in an error.',
+                '# TYPE weather_dashboard_cycles_failed_total counter',
+                f"weather_dashboard_cycles_failed_total {self.failed_total}",
+                '# HELP weather_dashboard_endpoint_errors_total Failed fetches per endpoint.',
+                '# TYPE weather_dashboard_endpoint_errors_total counter',
+            ]
+            lines += [f'weather_dashboard_endpoint_errors_total{{endpoint="{endpoint}"}} {count}'
+                      for endpoint, count in sorted(self.endpoint_errors.items())]
+            lines += [
+                '# HELP weather_dashboard_fetch_deadline_hits_total Endpoints cut off by the fetch stage deadline.',
+                '# TYPE weather_dashboard_fetch_deadline_hits_total counter',
+            ]
+            lines += [f'weather_dashboard_fetch_deadline_hits_total{{endpoint="{endpoint}"}} {count}'
+                      for endpoint, count in sorted(self.deadline_hits.items())]
+        if cycle is None:
+            return '\n'.join(lines) + '\n'
+        lines += [
+            '# HELP weather_dashboard_endpoint_seconds Fetch duration per endpoint in the last cycle.',
+            '# TYPE weather_dashboard_endpoint_seconds gauge',
+        ]
+        lines += [f'weather_dashboard_endpoint_seconds{{endpoint="{endpoint}"}} {seconds:.6f}'
+                  for endpoint, seconds in sorted(cycle['endpoints'].items())]
+        lines += [
+            '# HELP weather_dashboard_stage_seconds Duration of each pipeline stage in the last cycle.',
+            '# TYPE weather_dashboard_stage_seconds gauge',
+        ]
+        lines += [f'weather_dashboard_stage_seconds{{stage="{stage}"}} {seconds:.6f}'
+                  for stage, seconds in sorted(cycle['stages'].items())]
+        lines += [
+            '# HELP weather_dashboard_sleep_drift_seconds How much longer than requested the last sleep took.',
+            '# TYPE weather_dashboard_sleep_drift_seconds gauge',
+            f"weather_dashboard_sleep_drift_seconds {cycle['sleep_drift']:.6f}",
+            '# HELP weather_dashboard_rss_bytes Resident memory after the last cycle.',
+            '# TYPE weather_dashboard_rss_bytes gauge',
+            f"weather_dashboard_rss_bytes {cycle['rss_bytes']}",
+            '# HELP weather_dashboard_last_cycle_timestamp_seconds When the last cycle started.',
+            '# TYPE weather_dashboard_last_cycle_timestamp_seconds gauge',
+            f"weather_dashboard_last_cycle_timestamp_seconds {cycle['timestamp']:.0f}",
+        ]
+        return '\n'.join(lines) + '\n'
+
+def new_cycle_metrics(sleep_drift=0.0):
+    return {'timestamp': time.time(), 'endpoints': {}, 'errors': [], 'deadline_hits': [], 'stages': {},
+            'sleep_drift': sleep_drift, 'skipped': False, 'failed': False}
+
+@contextlib.contextmanager
+def stage_timer(cycle, stage):
+    """Time the enclosed block into cycle['stages'][stage]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        cycle['stages'][stage] = time.perf_counter() - start
+
+def get_rss_bytes():
+    """Current resident set size; falls back to the peak where /proc isn't available."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# Observation Store
+# On-disk layout: a header (magic, version, capacity, count, next slot), then capacity
+# fixed-size records. Readings that were unavailable are stored as NaN.
+OBSERVATIONS_FILE = 'observations.bin'
+OBSERVATION_HEADER = struct.Struct('<4sHxxIII')
+OBSERVATION_RECORD = struct.Struct('<IffffBBxx')
+OBSERVATION_MAGIC = b'WDTS'
+OBSERVATION_VERSION = 1
+# Field name -> position in an unpacked record
+OBSERVATION_FIELDS = ('timestamp', 'temp', 'humidity', 'wind_speed', 'feels_like', 'warning_count', 'warning_level')
+TREND_HOURS = 24
+# One averaged sparkline point per clock hour, the cadence rhrread publishes at. Slots are
+# fixed to the clock rather than to now, so points only move when an hour rolls over.
+TREND_SLOT_SECONDS = 3600
+
+class ObservationStore:
+    """Append-only ring buffer of per-cycle observations in a memory-mapped file.
+
+    Records have a fixed size and live only in the mapping, so the store never holds
+    per-sample Python objects and never grows past capacity - the oldest record is
+    overwritten. Appends are packed into a small pending buffer and copied into the
+    mapping flush_records at a time, so the SD card sees one batched write rather than one
+    per cycle. Timestamps only increase, so range queries binary-search the ring.
+    """
+
+    def __init__(self, path, capacity, flush_records=12):
+        self.path = path
+        self.flush_records = max(1, flush_records)
+        self.pending = bytearray()
+        self.lock = threading.Lock()
+        size = OBSERVATION_HEADER.size + capacity * OBSERVATION_RECORD.size
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, 'a+b')
+        self.file.seek(0)
+        header = self.file.read(OBSERVATION_HEADER.size)
+        if len(header) == OBSERVATION_HEADER.size and OBSERVATION_HEADER.unpack(header)[:3] == (OBSERVATION_MAGIC, OBSERVATION_VERSION, capacity):
+            _, _, self.capacity, self.count, self.next_slot = OBSERVATION_HEADER.unpack(header)
+        else:
+            if header:
+                logger.warning(f"Observation store {path} has a different layout or capacity, starting a new one.")
+            self.capacity, self.count, self.next_slot = capacity, 0, 0
+            self.file.truncate(0)
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.write_header()
+
+    def __len__(self):
+        return min(self.count + len(self.pending) // OBSERVATION_RECORD.size, self.capacity)
+
+    def append(self, timestamp, temp, humidity, wind_speed, feels_like, warning_count, warning_level):
+        """Queue one observation; None readings are stored as NaN."""
+        values = [math.nan if value is None else float(value) for value in (temp, humidity, wind_speed, feels_like)]
+        with self.lock:
+            if timestamp <= self.last_timestamp():
+                return  # keep the ring ordered for the binary search
+            self.pending += OBSERVATION_RECORD.pack(int(timestamp), *values, min(warning_count, 255), warning_level)
+            if len(self.pending) >= self.flush_records * OBSERVATION_RECORD.size:
+                self.flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        for offset in range(0, len(self.pending), OBSERVATION_RECORD.size):
+            start = OBSERVATION_HEADER.size + self.next_slot * OBSERVATION_RECORD.size
+            self.map[start:start + OBSERVATION_RECORD.size] = self.pending[offset:offset + OBSERVATION_RECORD.size]
+            self.next_slot = (self.next_slot + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+        if self.pending:
+            self.pending.clear()
+            self.write_header()
+            self.map.flush()
+
+    def close(self):
+        self.flush()
+        self.map.close()
+        self.file.close()
+
+    def write_header(self):
+        OBSERVATION_HEADER.pack_into(self.map, 0, OBSERVATION_MAGIC, OBSERVATION_VERSION, self.capacity, self.count, self.next_slot)
+
+    def record(self, index):
+        """Unpacked record by age order, 0 being the oldest; pending records come last."""
+        if index >= self.count:
+            return OBSERVATION_RECORD.unpack_from(self.pending, (index - self.count) * OBSERVATION_RECORD.size)
+        slot = (self.next_slot - self.count + index) % self.capacity
+        return OBSERVATION_RECORD.unpack_from(self.map, OBSERVATION_HEADER.size + slot * OBSERVATION_RECORD.size)
+
+    def last_timestamp(self):
+        total = self.count + len(self.pending) // OBSERVATION_RECORD.size
+        return self.record(total - 1)[0] if total else 0
+
+    def series(self, field, start, end):
+        """(timestamps, values) of one field for observations with start <= timestamp < end."""
+        position = OBSERVATION_FIELDS.index(field)
+        timestamps, values = array('I'), array('f')
+        with self.lock:
+            total = self.count + len(self.pending) // OBSERVATION_RECORD.size
+            low, high = 0, total
+            while low < high:
+                middle = (low + high) // 2
+                if self.record(middle)[0] < start:
+                    low = middle + 1
+                else:
+                    high = middle
+            for index in range(low, total):
+                record = self.record(index)
+                if record[0] >= end:
+                    break
+                timestamps.append(record[0])
+                values.append(record[position])
+        return timestamps, values
+
+    def add_cycle(self, timestamp, data):
+        """Record the readings of one processed cycle."""
+        warning_level = WARNING_SEVERITY_ORDER.index(get_overall_warning_color(data['warnsum_items'], data['warning_codes']))
+        active_count = sum(1 for label in data['warnsum_items'].values() if label != NO_WARNINGS_LABEL)
+        self.append(timestamp, data['current_temp'], data['current_humidity'], data['wind_speed'], data['feels_like'],
+                    active_count, warning_level)
+
+    def temp_trend(self, now):
+        """Sparkline points for the last TREND_HOURS hourly slots of temperature (the current,
+        still open hour last), with today's low/high so far."""
+        first_slot = int(now) // TREND_SLOT_SECONDS - TREND_HOURS + 1
+        timestamps, values = self.series('temp', first_slot * TREND_SLOT_SECONDS, int(now) + 1)
+        buckets = [[] for _ in range(TREND_HOURS)]
+        for timestamp, value in zip(timestamps, values):
+            if not math.isnan(value):
+                buckets[timestamp // TREND_SLOT_SECONDS - first_slot].append(value)
+        midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        today = [value for timestamp, value in zip(timestamps, values) if timestamp >= midnight and not math.isnan(value)]
+        if not today:
+            return None
+        return {
+            'points': [round(statistics.mean(bucket), 1) if bucket else None for bucket in buckets],
+            'low': round(min(today)),
+            'high': round(max(today)),
+        }
+
+# Refresh Pipeline
+class RefreshPipeline:
+    """Render and display stages, each on its own thread, fed by the fetch loop in main().
+
+    A job is one fetched cycle: {'cycle', 'settings', 'fonts', 'raw'}, carrying its own
+    settings/fonts snapshot. The render thread turns jobs into frames and the display
+    thread writes frames to the panel. Both hand-offs are one-slot, latest-wins queues, so
+    a slow epd.display() never holds up the next fetch and a newer frame replaces one
+    still waiting instead of queueing behind it. render() and display() are plain methods,
+    so a cycle can also be run inline on the calling thread.
+    """
+
+    def __init__(self, epd, fill_color, metrics, warning_watcher=None, displayed_fingerprint=None, observations=None):
+        self.epd = epd
+        self.observations = observations
+        self.fill_color = fill_color
+        self.metrics = metrics
+        self.warning_watcher = warning_watcher
+        # Fingerprint of the last frame handed to the display stage - a full refresh of the
+        # Spectra panel takes tens of seconds and flashes the screen, so skip it when
+        # nothing visible changed.
+        self.rendered_fingerprint = displayed_fingerprint
+        self.refreshed_count = self.skipped_count = 0
+        self.render_queue = queue.Queue(maxsize=1)
+        self.display_queue = queue.Queue(maxsize=1)
+        self.threads = [
+            threading.Thread(target=self.run_stage, args=(self.render_queue, self.render, self.display_queue), name='render', daemon=True),
+            threading.Thread(target=self.run_stage, args=(self.display_queue, self.display, None), name='display', daemon=True),
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, job):
+        self.put_latest(self.render_queue, job)
+
+    def shutdown(self):
+        """Drop pending work and wait for the stages to finish what they are doing, so a
+        panel write in progress completes before the caller clears the screen."""
+        self.put_latest(self.render_queue, None)
+        for thread in self.threads:
+            thread.join()
+
+    def put_latest(self, stage_queue, item):
+        while True:
+            try:
+                stage_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    superseded = stage_queue.get_nowait()
+                except queue.Empty:
+                    continue
+                if superseded is not None:
+                    logger.info('A newer cycle superseded one still waiting in the pipeline.')
+                    superseded['cycle']['skipped'] = True
+                    self.metrics.record(superseded['cycle'])
+
+    def run_stage(self, in_queue, stage, out_queue):
+        while True:
+            item = in_queue.get()
+            if item is None:
+                if out_queue is not None:
+                    self.put_latest(out_queue, None)
+                return
+            try:
+                result = stage(item)
+            except Exception:
+                logger.exception(f"Error in the {threading.current_thread().name} stage:")
+                item['cycle']['failed'] = True
+                self.metrics.record(item['cycle'])
+                continue
+            if result is not None and out_queue is not None:
+                self.put_latest(out_queue, result)
+
+    def render(self, job):
+        """Process and draw a fetched cycle; returns the frame, or None if nothing changed."""
+        cycle, settings = job['cycle'], job['settings']
+        with stage_timer(cycle, 'process_data'):
+            processed_data = process_data(job['raw'], settings)
+            if self.observations is not None:
+                self.observations.add_cycle(int(cycle['timestamp']), processed_data)
+                if settings['show_trend']:
+                    processed_data['temp_trend'] = self.observations.temp_trend(int(cycle['timestamp']))
+        fingerprint = fingerprint_data(processed_data, settings)
+        if fingerprint == self.rendered_fingerprint:
+            self.skipped_count += 1
+            cycle['skipped'] = True
+            logger.info(f"Nothing visible changed, display refresh skipped (refreshed={self.refreshed_count}, skipped={self.skipped_count}).")
+            if self.warning_watcher:
+                self.warning_watcher.set_rendered(processed_data['warnsum_items'], processed_data['warninfo_items'],
+                                                  processed_data['warning_codes'])
+            self.metrics.record(cycle)
+            return None
+        with stage_timer(cycle, 'draw_screen'):
+            screen_image = draw_screen(processed_data, job['fonts'], settings, self.fill_color)
+        panel_buffer = None
+        if self.epd:
+            with stage_timer(cycle, 'getbuffer'):
+                panel_buffer = get_panel_buffer(self.epd, screen_image, settings['dither'])
+        self.rendered_fingerprint = fingerprint
+        return dict(job, processed=processed_data, fingerprint=fingerprint, image=screen_image, buffer=panel_buffer)
+
+    def display(self, frame):
+        """Write a rendered frame to the panel (or preview it in DEV mode)."""
+        cycle = frame['cycle']
+        try:
+            with stage_timer(cycle, 'display'):
+                if self.epd:
+                    self.epd.display(frame['buffer'])
+                else:
+                    frame['image'].show()
+        except Exception:
+            self.rendered_fingerprint = None  # the panel state is unknown, so redraw next cycle
+            raise
+        if self.epd:
+            save_boot_frame(frame['buffer'], frame['processed'], frame['fingerprint'])
+        if self.warning_watcher:
+            processed_data = frame['processed']
+            self.warning_watcher.set_rendered(processed_data['warnsum_items'], processed_data['warninfo_items'],
+                                              processed_data['warning_codes'])
+        self.refreshed_count += 1
+        logger.info(f"Refresh cycle complete (refreshed={self.refreshed_count}, skipped={self.skipped_count}).")
+        self.metrics.record(cycle)
+
+# Render Server
+class RenderServer:
+    """SERVER mode: renders a frame for every [Panel:<name>] profile and serves it over HTTP.
+
+    Each cycle fetches the datasets once per language in use. The language-independent
+    ones (SRS, OpenWeatherMap) come out of the response cache after the first language.
+    Every profile is processed and fingerprinted here, and only profiles whose fingerprint
+    changed go to the process pool for drawing and packing. Frames are served as
+    /panels/<name>.png and /panels/<name>.bin with the fingerprint as ETag, so a client
+    polling an unchanged frame gets a 304.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.profiles = settings['panels'] or {'default': settings}
+        self.frames = {}  # profile name -> {'fingerprint', 'png', 'bin'}
+        self.lock = threading.Lock()
+        self.pool = ProcessPoolExecutor(max_workers=settings['render_workers'], initializer=init_render_worker,
+                                        initargs=(self.profiles,))
+        self.http_server = None
+
+    def start(self):
+        render_server = self
+
+        class FrameHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                name, extension = os.path.splitext(self.path[len('/panels/'):])
+                with render_server.lock:
+                    frame = render_server.frames.get(name)
+                body = frame.get(extension.lstrip('.')) if frame and self.path.startswith('/panels/') else None
+                if body is None:
+                    self.send_error(404)
+                    return
+                etag = f'"{frame["fingerprint"]}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png' if extension == '.png' else 'application/octet-stream')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # client polls would swamp the log
+
+        self.http_server = ThreadingHTTPServer(('', self.settings['server_port']), FrameHandler)
+        threading.Thread(target=self.http_server.serve_forever, name='render-http', daemon=True).start()
+        logger.info(f"Serving {len(self.profiles)} panel(s) on port {self.settings['server_port']}: {', '.join(self.profiles)}.")
+
+    def shutdown(self):
+        if self.http_server:
+            self.http_server.shutdown()
+        self.pool.shutdown()
+
+    def refresh(self, cycle, revalidate=()):
+        """Fetch, then re-render every profile whose data changed. Returns the raw data of
+        the first language, for the scheduler."""
+        raw_by_language = {}
+        for language in sorted({profile['language'] for profile in self.profiles.values()}):
+            raw_by_language[language] = fetch_data(dict(self.settings, language=language), cycle, revalidate)
+
+        renders = {}
+        with stage_timer(cycle, 'process_data'):
+            for name, profile in self.profiles.items():
+                processed_data = process_data(raw_by_language[profile['language']], profile)
+                fingerprint = fingerprint_data(processed_data, profile)
+                if self.frames.get(name, {}).get('fingerprint') != fingerprint:
+                    renders[name] = (fingerprint, self.pool.submit(render_frame, name, processed_data, profile))
+        with stage_timer(cycle, 'draw_screen'):
+            for name, (fingerprint, future) in renders.items():
+                png, packed = future.result()
+                with self.lock:
+                    self.frames[name] = {'fingerprint': fingerprint, 'png': png, 'bin': packed}
+        cycle['skipped'] = not renders
+        logger.info(f"Rendered {len(renders)} of {len(self.profiles)} panel(s): {', '.join(renders) or 'none changed'}.")
+        return next(iter(raw_by_language.values()))
+
+# Fonts of the profiles, opened once per render worker process
+_worker_fonts = {}
+
+def init_render_worker(profiles):
+    for name, profile in profiles.items():
+        fonts = load_fonts(profile)
+        for key in FRAME_FONT_KEYS:
+            fonts[key]
+        _worker_fonts[name] = fonts
+
+def render_frame(name, processed_data, profile):
+    """Draw one profile's frame in a render worker; returns (PNG bytes, packed panel buffer).
+    The packed buffer needs NumPy and is None without it."""
+    image = draw_screen(processed_data, _worker_fonts[name], profile, 'black')
+    png = io.BytesIO()
+    image.save(png, 'PNG')
+    packed = bytes(pack_panel_buffer(image, profile['dither'])) if np is not None else None
+    return png.getvalue(), packed
+
+def run_server(settings):
+    if np is None:
+        logger.warning('NumPy is not installed; only PNG frames will be served.')
+    server = RenderServer(settings)
+    server.start()
+    metrics = MetricsExporter(settings)
+    metrics.start()
+    scheduler = RefreshScheduler(settings)
+    try:
+        while True:
+            cycle = new_cycle_metrics()
+            try:
+                scheduler.observe(server.refresh(cycle, scheduler.due_datasets()))
+                delay = scheduler.next_delay()
+            except Exception:
+                logger.exception("Unexpected error occurred:")
+                cycle['failed'] = True
+                delay = scheduler.failure_delay()
+            metrics.record(cycle)
+            logger.info(f"Waiting {delay:.0f} seconds...")
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        logger.info('Shutting down render server...')
+        server.shutdown()
+
+def run_client(settings):
+    """CLIENT mode: poll a render server for this panel's packed frame and display it."""
+    from waveshare_epd import epd7in3e
+    epd = epd7in3e.EPD()
+    logger.info('Initializing e-Ink screen...')
+    epd.init()
+    boot_state = restore_boot_frame(epd)
+    fingerprint = boot_state['fingerprint'] if boot_state else None
+    url = f"{settings['server_url'].rstrip('/')}/panels/{settings.get('panel_name', 'default')}.bin"
+    logger.info(f"Polling {url} every {settings['client_poll_seconds']} seconds.")
+    try:
+        while True:
+            try:
+                headers = {'If-None-Match': f'"{fingerprint}"'} if fingerprint else {}
+                response = http_session.get(url, headers=headers, timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT))
+                etag = response.headers.get('ETag')
+                if response.status_code == 304:
+                    logger.info('Frame unchanged, display refresh skipped.')
+                elif response.status_code != 200:
+                    logger.warning(f"Render server answered {response.status_code}.")
+                elif not etag or len(response.content) != DISPLAY_WIDTH * DISPLAY_HEIGHT // 2:
+                    logger.warning(f"Ignoring a malformed frame from the render server ({len(response.content)} bytes, ETag {etag}).")
+                else:
+                    epd.display(response.content)
+                    fingerprint = etag.strip('"')
+                    save_boot_frame(response.content, {}, fingerprint)
+                    logger.info('Displayed a new frame from the render server.')
+            except requests.RequestException as e:
+                logger.warning(f"Cannot reach the render server: {e}")
+            except Exception:
+                logger.exception('Displaying the frame from the render server failed:')
+            time.sleep(settings['client_poll_seconds'])
+    except KeyboardInterrupt:
+        logger.info('Clearing e-Ink screen before exit...')
+        epd.Clear()
+        mark_boot_frame_cleared()
+        logger.info('Putting e-Ink screen to sleep...')
+        epd.sleep()
+
 # Process Data
 def process_data(raw, settings):
     logger.info('Processing data...')
-    today = datetime.now().strftime("%Y-%m-%d")
-    sunrise = sunset = ''
-    for day in raw['srs'].get('data', []):
-        if day[0] == today:
-            sunrise, sunset = str(day[1]), str(day[3])
+    sunrise, sunset = raw['srs'].times(datetime.now().date())
 
-    warnsum_items, warninfo_items = process_warning_data(raw['warning_summary'], raw['warning_info'], raw['special_weather'])
+    warnsum_items, warninfo_items, warning_codes = process_warning_data(raw['warning_summary'], raw['warning_info'], raw['special_weather'])
     warnsum_items = warnsum_items or {'1': NO_WARNINGS_LABEL}
     warninfo_items = warninfo_items or {'1': [NO_WARNINGS_LABEL]}
     logger.info('Data processed successfully.')
@@ -143,74 +1218,156 @@ def process_data(raw, settings):
         'min_temp': round(raw['openweathermap']['main']['temp_min']),
         'seven_day_forecast': raw['nine_day_forecast'].get('weatherForecast', [])[:7],
         'warnsum_items': warnsum_items,
-        'warninfo_items': warninfo_items
+        'warninfo_items': warninfo_items,
+        'warning_codes': warning_codes,
+        'stale_sources': sorted(raw.get('stale', {})),
+        'temp_trend': None
     }
 
 # Draw Screen
-def draw_screen(data, fonts, settings, fill_color):
-    SHIFT_RIGHT = 17
-    LEFT_COL_X = 26
-    LEFT_COL_WIDTH = 388
-    DIVIDER_X = 430
-    RIGHT_COL_X = 452
-    RIGHT_COL_RIGHT = DISPLAY_WIDTH - 26  # 774
-    image = Image.new('RGB', (DISPLAY_WIDTH, DISPLAY_HEIGHT), 'white')
+def draw_screen(data, fonts, settings, fill_color, dirty_regions=None):
+    """Compose the dashboard frame from a cached static layer and per-panel layers.
+
+    The chrome (dividers, tile icons and labels) is rendered once into a base layer. Each
+    panel in PANELS is re-rendered on top of a copy of that base only when its own inputs
+    changed since the last frame, then cropped to its box and composited. Pass a list as
+    dirty_regions to get the (x0, y0, x1, y1) boxes that were re-rendered this call.
+    """
+    panel_data = dict(data,
+                      today_title=datetime.now().strftime('%A, %B %d'),
+                      last_update_text=datetime.now().strftime("最後更新: %Y-%m-%d %H:%M"))
+    # Fonts by file path: comparing the registries themselves would open every face in both
+    style_key = (fonts.paths, fill_color, settings['max_lines'], settings['icon_atlas'], settings['render_mode'], settings['dither'])
+
+    cached_static = _layer_cache.get('static')
+    if cached_static is None or cached_static[0] != style_key:
+        _layer_cache.clear()
+        cached_static = (style_key, draw_static_layer(fonts, settings, fill_color))
+        _layer_cache['static'] = cached_static
+    base = cached_static[1]
+
+    image = base.copy()
+    redrawn = []
+    for name, (box, fields, sources, draw_panel) in PANELS.items():
+        stale = any(source in data['stale_sources'] for source in sources)
+        panel_key = (style_key, [panel_data[field] for field in fields], stale)
+        cached_panel = _layer_cache.get(name)
+        if cached_panel is None or cached_panel[0] != panel_key:
+            canvas = base.copy()
+            draw = ImageDraw.Draw(canvas)
+            draw_panel(canvas, draw, panel_data, fonts, settings, fill_color)
+            if stale:
+                draw_stale_marker(draw, box)
+            cached_panel = (panel_key, canvas.crop(box))
+            _layer_cache[name] = cached_panel
+            redrawn.append(name)
+            if dirty_regions is not None:
+                dirty_regions.append(box)
+        image.paste(cached_panel[1], box[:2])
+    logger.debug(f"Re-rendered panels: {', '.join(redrawn) or 'none'}")
+    return image
+
+def draw_static_layer(fonts, settings, fill_color):
+    """Render everything that never changes between frames: dividers, tile icons and labels."""
+    image = new_frame_image(settings)
     draw = ImageDraw.Draw(image)
 
+    # Column divider
+    draw.line([(DIVIDER_X, 74), (DIVIDER_X, 326)], fill=COLOR_BLACK, width=2)
+    # Hero / alert panel divider
+    draw.line([(LEFT_COL_X, 212), (LEFT_COL_X + LEFT_COL_WIDTH, 212)], fill=COLOR_BLACK, width=1)
+
+    # Sunrise/Sunset/Wind/Humidity icons and labels
+    for icon_file, label, _, img_pos, label_pos, value_center_x in WEATHER_TILES:
+        icon = get_frame_icon(ICON_DIR_SMALL, icon_file, SMALL_ICON_SIZE, settings)
+        image.paste(icon, img_pos)
+
+        # Center-align label
+        label_width = text_length(label, fonts['chinese_normal'])
+        label_x = value_center_x - label_width // 2
+        draw.text((label_x, label_pos[1]), label, font=fonts['chinese_normal'], fill=fill_color)
+
+    draw.line([(RIGHT_COL_X, 152), (RIGHT_COL_RIGHT, 152)], fill=COLOR_BLACK, width=1)
+    draw.line([(RIGHT_COL_X, 238), (RIGHT_COL_RIGHT, 238)], fill=COLOR_BLACK, width=1)
+
+    # 7-day forecast divider
+    draw.line([(LEFT_COL_X, 332), (RIGHT_COL_RIGHT, 332)], fill=COLOR_BLACK, width=2)
+    return image
+
+def draw_title_panel(image, draw, data, fonts, settings, fill_color):
     # Title bar - green when all clear, otherwise the most severe active warning
     # (black > red > yellow > blue)
-    title_bar_color = get_overall_warning_color(data['warnsum_items'])
+    title_bar_color = get_overall_warning_color(data['warnsum_items'], data['warning_codes'])
     title_text_color = COLOR_BLACK if title_bar_color == COLOR_YELLOW else COLOR_WHITE
     draw.rectangle([0, 0, DISPLAY_WIDTH, 56], fill=title_bar_color)
-    today_title = datetime.now().strftime('%A, %B %d')
-    draw.text((LEFT_COL_X, 13), today_title, font=fonts['large'], fill=title_text_color)
-    last_update_text = datetime.now().strftime("最後更新: %Y-%m-%d %H:%M")
-    update_w = fonts['last_update'].getbbox(last_update_text)[2]
+    draw.text((LEFT_COL_X, 13), data['today_title'], font=fonts['large'], fill=title_text_color)
+    last_update_text = data['last_update_text']
+    update_w = text_bbox(last_update_text, fonts['last_update'])[2]
     draw.text((RIGHT_COL_RIGHT - update_w, 20), last_update_text, font=fonts['last_update'], fill=title_text_color)
-
-    # Column divider
-    draw.line([(DIVIDER_X, 74), (DIVIDER_X, 326)], fill=COLOR_BLACK, width=2)
-
-    # Current Weather
-    # Mapping of special weather warning names to icon filenames
-    special_warning_map = {
-        '一號戒備信號': 'T1.bmp',
-        '三號強風信號': 'T3.bmp',
-        '八號東北烈風或暴風信號': 'T8NE.bmp',
-        '八號東南烈風或暴風信號': 'T8SE.bmp',
-        '八號西南烈風或暴風信號': 'T8SW.bmp',
-        '八號西北烈風或暴風信號': 'T8NW.bmp',
-        '九號烈風或暴風風力增強信號': 'T9.bmp',
-        '十號颶風信號': 'T10.bmp',
-        '黃色暴雨警告信號': 'AmberRainstorm.bmp',
-        '紅色暴雨警告信號': 'RedRainstorm.bmp',
-        '黑色暴雨警告信號': 'BlackRainstorm.bmp',
-    }
-    # Check if any warnsum_items value matches a warning name
-    warnsum_icon = None
-    for value in data['warnsum_items'].values():
-        if value in special_warning_map:
-            warnsum_icon = special_warning_map[value]
-            break
-    if warnsum_icon:
-        weather_icon = Image.open(f"{ICON_DIR_LARGE}/{warnsum_icon}")
-    else:
-        weather_icon = Image.open(f"{ICON_DIR_LARGE}/{data['current_weather_icon']}.bmp")
-    # Icons are 150x150, but the alert-panel row only has 138px (74 to the divider at
-    # 212) before it collides with the badges row below - scale down to fit.
-    HERO_ICON_SIZE = 130
-    weather_icon = weather_icon.resize((HERO_ICON_SIZE, HERO_ICON_SIZE), Image.LANCZOS)
+    if data['temp_trend']:
+        # In the gap between the date and the 最後更新 stamp, whatever their lengths
+        gap_left = LEFT_COL_X + text_length(data['today_title'], fonts['large']) + 20
+        gap_right = RIGHT_COL_RIGHT - update_w - 20
+        draw_trend_sparkline(draw, data['temp_trend'], fonts, title_text_color, gap_left, gap_right)
+
+def draw_trend_sparkline(draw, trend, fonts, color, gap_left, gap_right, max_width=120, min_width=48):
+    """24h temperature sparkline with today's high/low to its right, drawn from gap_left
+    and kept left of gap_right. Up to max_width wide; skipped if less than min_width fits."""
+    labels = (f"{trend['high']}°", f"{trend['low']}°")
+    label_width = max(text_length(label, fonts['small_text']) for label in labels)
+    left, top, bottom = gap_left, 14, 42
+    right = min(left + max_width, gap_right - label_width - 10)
+    if right - left < min_width:
+        return
+    known = [value for value in trend['points'] if value is not None]
+    low, high = min(known), max(known)
+    step = (right - left) / (len(trend['points']) - 1)
+    segment = []
+    for i, value in enumerate(trend['points'] + [None]):
+        if value is None:
+            if len(segment) > 1:
+                draw.line(segment, fill=color, width=2)
+            segment = []
+            continue
+        y = bottom - (value - low) / (high - low) * (bottom - top) if high > low else (top + bottom) / 2
+        segment.append((left + i * step, y))
+    draw.text((right + 10, 14), labels[0], font=fonts['small_text'], fill=color)
+    draw.text((right + 10, 30), labels[1], font=fonts['small_text'], fill=color)
+
+def draw_hero_panel(image, draw, data, fonts, settings, fill_color):
+    # Current Weather - replaced by the signal/rainstorm icon while one is in force
+    hero_icon_file = get_warning_icon(data['warnsum_items'], data['warning_codes']) or f"{data['current_weather_icon']}.bmp"
+    weather_icon = get_frame_icon(ICON_DIR_LARGE, hero_icon_file, HERO_ICON_SIZE, settings)
     image.paste(weather_icon, (LEFT_COL_X + 20, 74))
 
+    temp_text = str(data['current_temp'])
+    info_row_segments = (
+        (f"{data['max_temp']}°", fonts['normal'], COLOR_RED, 6),
+        ("/", fonts['normal'], fill_color, 6),
+        (f"{data['min_temp']}°", fonts['normal'], COLOR_BLUE, 20),
+        ("體感温度:", fonts['chinese_light_large'], fill_color, 6),
+        (f"{data['feels_like']}°", fonts['normal'], fill_color, 0),
+    )
+    temp_pos, degree_pos, segment_positions = layout_hero_text(
+        temp_text, fonts['current_temp'], fonts['degree_celsius'], fonts['chinese_light_large'],
+        tuple((text, font, gap_after) for text, font, _, gap_after in info_row_segments))
+    draw.text(temp_pos, temp_text, font=fonts['current_temp'], fill=fill_color)
+    draw.text(degree_pos, '°C', font=fonts['degree_celsius'], fill=fill_color)
+    for (text, font, color, _), position in zip(info_row_segments, segment_positions):
+        draw.text(position, text, font=font, fill=color)
+
+@functools.lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def layout_hero_text(temp_text, temp_font, degree_font, info_font, info_row_segments):
+    """Positions of the big temperature, its °C and each (text, font, gap_after) segment of
+    the info row. Pure geometry, so it is computed once per distinct set of strings."""
     # Vertically center the [number + info row] block as a unit within the icon's height,
     # rather than centering just the number on the icon's midpoint - that left a bigger
     # gap above the number than below the info row, since the row's own height wasn't
     # accounted for.
     ROW_GAP = 14
-    temp_text = str(data['current_temp'])
-    temp_bbox = draw.textbbox((0, 0), temp_text, font=fonts['current_temp'])
+    temp_bbox = text_bbox(temp_text, temp_font)
     temp_ink_height = temp_bbox[3] - temp_bbox[1]
-    info_bbox = draw.textbbox((0, 0), "體感温度:", font=fonts['chinese_light_large'])
+    info_bbox = text_bbox("體感温度:", info_font)
     info_ink_height = info_bbox[3] - info_bbox[1]
     block_height = temp_ink_height + ROW_GAP + info_ink_height
     temp_ink_top = 74 + (HERO_ICON_SIZE - block_height) / 2
@@ -220,21 +1377,12 @@ def draw_screen(data, fonts, settings, fill_color):
     # text), so left-aligning both at the same x leaves the number looking off-center.
     # Measure the info row's total width first and center the number over its span.
     INFO_ROW_X = 200
-    info_row_segments = (
-        (f"{data['max_temp']}°", fonts['normal'], COLOR_RED, 6),
-        ("/", fonts['normal'], fill_color, 6),
-        (f"{data['min_temp']}°", fonts['normal'], COLOR_BLUE, 20),
-        ("體感温度:", fonts['chinese_light_large'], fill_color, 6),
-        (f"{data['feels_like']}°", fonts['normal'], fill_color, 0),
-    )
-    info_row_width = sum(draw.textlength(text, font=font) + gap_after for text, font, _, gap_after in info_row_segments)
+    info_row_width = sum(text_length(text, font) + gap_after for text, font, gap_after in info_row_segments)
 
-    temp_w = draw.textlength(temp_text, font=fonts['current_temp'])
-    degree_w = draw.textlength('°C', font=fonts['degree_celsius'])
+    temp_w = text_length(temp_text, temp_font)
+    degree_w = text_length('°C', degree_font)
     temp_block_width = temp_w + 4 + degree_w
     temp_x = INFO_ROW_X + (info_row_width - temp_block_width) / 2
-    draw.text((temp_x, temp_y), temp_text, font=fonts['current_temp'], fill=fill_color)
-    draw.text((temp_x + temp_w + 4, temp_y + 10), '°C', font=fonts['degree_celsius'], fill=fill_color)
 
     # Cumulative x-positioning keeps this row inside the alert column regardless of
     # digit count, instead of the fixed offsets that used to overrun the divider.
@@ -243,59 +1391,39 @@ def draw_screen(data, fonts, settings, fill_color):
     GRID_LINE_Y = 212
     temp_bottom = temp_ink_top + temp_ink_height
     info_row_y = temp_bottom + (GRID_LINE_Y - temp_bottom - info_ink_height) / 2 - info_bbox[1]
+    segment_positions = []
     x = INFO_ROW_X
-    for text, font, color, gap_after in info_row_segments:
-        draw.text((x, info_row_y), text, font=font, fill=color)
-        x += draw.textlength(text, font=font) + gap_after
+    for text, font, gap_after in info_row_segments:
+        segment_positions.append((x, info_row_y))
+        x += text_length(text, font) + gap_after
+    return (temp_x, temp_y), (temp_x + temp_w + 4, temp_y + 10), tuple(segment_positions)
 
+def draw_alert_panel(image, draw, data, fonts, settings, fill_color):
     # Warning badges + detail (alert panel)
     warning_items = process_warning_items(data['warnsum_items'])
-    draw.line([(LEFT_COL_X, 212), (LEFT_COL_X + LEFT_COL_WIDTH, 212)], fill=COLOR_BLACK, width=1)
-    badges_bottom_y = draw_warning_badges(draw, warning_items, fonts['chinese_bold'], LEFT_COL_X, 224, LEFT_COL_WIDTH)
+    badges_bottom_y = draw_warning_badges(draw, warning_items, data['warning_codes'], fonts['chinese_bold'], LEFT_COL_X, 224, LEFT_COL_WIDTH)
 
     detail_start_y = badges_bottom_y + 8
     detail_available_height = 326 - detail_start_y
     line_height = fonts['chinese_normal'].size + 6
     max_detail_lines = max(1, detail_available_height // line_height)
-    wrapped_warning = wrap_and_truncate(data['warninfo_items']['1'], 27, min(settings['max_lines'], max_detail_lines))
+    wrapped_warning = wrap_and_truncate(data['warninfo_items']['1'], fonts['chinese_normal'], LEFT_COL_WIDTH, min(settings['max_lines'], max_detail_lines))
     draw.multiline_text((LEFT_COL_X, detail_start_y), "\n".join(wrapped_warning), font=fonts['chinese_normal'], fill=fill_color, spacing=3)
 
-    # Sunrise/Sunset/Wind/Humidity
-    static_info = [
-        ('sunset.bmp', '日落', data['sunset'], (RIGHT_COL_X, 82), (RIGHT_COL_X + 90, 93), RIGHT_COL_X + 80 + SHIFT_RIGHT),
-        ('sunrise.bmp', '日出', data['sunrise'], (RIGHT_COL_X + 182, 82), (RIGHT_COL_X + 272, 93), RIGHT_COL_X + 262 + SHIFT_RIGHT),
-    ]
-
-    dynamic_info = [
-        ('wind.bmp', '風速', f"{data['wind_dir']}@{data['wind_speed']}", 'm/s', (RIGHT_COL_X, 168), (RIGHT_COL_X + 90, 179), RIGHT_COL_X + 80 + SHIFT_RIGHT),
-        ('humidity.bmp', '濕度', f"{data['current_humidity']}", '%', (RIGHT_COL_X + 182, 168), (RIGHT_COL_X + 272, 179), RIGHT_COL_X + 262 + SHIFT_RIGHT)
-    ]
-    for icon_file, label, value, img_pos, label_pos, value_center_x in static_info:
-        icon = Image.open(f"{ICON_DIR_SMALL}/{icon_file}").resize((SMALL_ICON_SIZE, SMALL_ICON_SIZE), Image.LANCZOS)
-        image.paste(icon, img_pos)
-
-        # Center-align label
-        label_width = draw.textlength(label, font=fonts['chinese_normal'])
-        label_x = value_center_x - label_width // 2
-        draw.text((label_x, label_pos[1]), label, font=fonts['chinese_normal'], fill=fill_color)
-
-        # Center-align value
-        text_width = draw.textlength(str(value), font=fonts['top_right_value'])
-        draw.text((value_center_x - text_width // 2, img_pos[1] + 35), str(value), font=fonts['top_right_value'], fill=fill_color)
-
-    for icon_file, label, value, unit, img_pos, label_pos, value_center_x in dynamic_info:
-        icon = Image.open(f"{ICON_DIR_SMALL}/{icon_file}").resize((SMALL_ICON_SIZE, SMALL_ICON_SIZE), Image.LANCZOS)
-        image.paste(icon, img_pos)
-
-        # Center-align label
-        label_width = draw.textlength(label, font=fonts['chinese_normal'])
-        label_x = value_center_x - label_width // 2
-        draw.text((label_x, label_pos[1]), label, font=fonts['chinese_normal'], fill=fill_color)
+def draw_tiles_panel(image, draw, data, fonts, settings, fill_color):
+    # Sunrise/Sunset/Wind/Humidity values - icons and labels live in the static layer
+    tile_values = (data['sunset'], data['sunrise'], f"{data['wind_dir']}@{data['wind_speed']}", f"{data['current_humidity']}")
+    for (_, _, unit, img_pos, _, value_center_x), value in zip(WEATHER_TILES, tile_values):
+        value_text = str(value)
+        if unit is None:
+            # Center-align value
+            text_width = text_length(value_text, fonts['top_right_value'])
+            draw.text((value_center_x - text_width // 2, img_pos[1] + 35), value_text, font=fonts['top_right_value'], fill=fill_color)
+            continue
 
         # Center-align value + unit
-        value_text = str(value)
-        value_bbox = draw.textbbox((0, 0), value_text, font=fonts['top_right_value'])
-        unit_bbox = draw.textbbox((0, 0), unit, font=fonts['unit'])
+        value_bbox = text_bbox(value_text, fonts['top_right_value'])
+        unit_bbox = text_bbox(unit, fonts['unit'])
         total_width = (value_bbox[2] - value_bbox[0]) + (unit_bbox[2] - unit_bbox[0]) + 2
         value_x = value_center_x - total_width // 2
         unit_x = value_x + (value_bbox[2] - value_bbox[0]) + 2
@@ -304,20 +1432,19 @@ def draw_screen(data, fonts, settings, fill_color):
         draw.text((value_x, value_y), value_text, font=fonts['top_right_value'], fill=fill_color)
         draw.text((unit_x, unit_y), unit, font=fonts['unit'], fill=fill_color)
 
-    draw.line([(RIGHT_COL_X, 152), (RIGHT_COL_RIGHT, 152)], fill=COLOR_BLACK, width=1)
-    draw.line([(RIGHT_COL_X, 238), (RIGHT_COL_RIGHT, 238)], fill=COLOR_BLACK, width=1)
-
+def draw_forecast_panel(image, draw, data, fonts, settings, fill_color):
     # Forecast period description - vertically centered as a block within its grid
     # cell (between the tiles divider and the 7-day divider), rather than pinned to top.
     FORECAST_SECTION_TOP, FORECAST_SECTION_BOTTOM = 238, 332
     LABEL_DESC_GAP = 10
+    line_height = fonts['chinese_normal'].size + 6
     label_text = f"{data['forecast_period']}:"
-    label_bbox = draw.textbbox((0, 0), label_text, font=fonts['chinese_bold'])
+    label_bbox = text_bbox(label_text, fonts['chinese_bold'])
     label_height = label_bbox[3] - label_bbox[1]
     max_forecast_lines = max(1, (FORECAST_SECTION_BOTTOM - FORECAST_SECTION_TOP - label_height - LABEL_DESC_GAP) // line_height)
-    wrapped_forecast = wrap_and_truncate([data['forecast_description']], 19, min(settings['max_lines'], max_forecast_lines))
+    wrapped_forecast = wrap_and_truncate([data['forecast_description']], fonts['chinese_normal'], RIGHT_COL_RIGHT - RIGHT_COL_X, min(settings['max_lines'], max_forecast_lines))
     desc_text = "\n".join(wrapped_forecast)
-    desc_bbox = draw.multiline_textbbox((0, 0), desc_text, font=fonts['chinese_normal'], spacing=3)
+    desc_bbox = multiline_text_bbox(desc_text, fonts['chinese_normal'], 3)
     desc_height = desc_bbox[3] - desc_bbox[1]
     block_top = FORECAST_SECTION_TOP + (FORECAST_SECTION_BOTTOM - FORECAST_SECTION_TOP - label_height - LABEL_DESC_GAP - desc_height) // 2
 
@@ -326,9 +1453,8 @@ def draw_screen(data, fonts, settings, fill_color):
     desc_y = block_top + label_height + LABEL_DESC_GAP - desc_bbox[1]
     draw.multiline_text((RIGHT_COL_X, desc_y), desc_text, font=fonts['chinese_normal'], fill=fill_color, spacing=3)
 
+def draw_seven_day_panel(image, draw, data, fonts, settings, fill_color):
     # 7-day forecast
-    draw.line([(LEFT_COL_X, 332), (RIGHT_COL_RIGHT, 332)], fill=COLOR_BLACK, width=2)
-
     seven_day = data['seven_day_forecast']
 
     DAY_COL_WIDTH = (RIGHT_COL_RIGHT - LEFT_COL_X) / len(seven_day) if seven_day else 0
@@ -339,38 +1465,129 @@ def draw_screen(data, fonts, settings, fill_color):
         min_temp = day['forecastMintemp']['value']
         max_temp = day['forecastMaxtemp']['value']
         icon_code = day['ForecastIcon']
-        day_img = Image.new('RGB', (BOX_WIDTH, BOX_HEIGHT), color='white')
-        day_draw = ImageDraw.Draw(day_img)
+        # Drawn in place at the day's box origin - the box area of the base layer is blank
+        x, y = LEFT_COL_X + round(i * DAY_COL_WIDTH), 340
 
         max_str, slash_str, min_str = f"{max_temp}°", " / ", f"{min_temp}°"
-        max_tw = day_draw.textlength(max_str, font=fonts['forecast_text'])
-        slash_tw = day_draw.textlength(slash_str, font=fonts['forecast_text'])
-        min_tw = day_draw.textlength(min_str, font=fonts['forecast_text'])
-        temp_x = (BOX_WIDTH - max_tw - slash_tw - min_tw) // 2
-
-        # Evenly space the week label, icon, and temp row across the box now that the
-        # range bar is gone, instead of the old fixed y-offsets that assumed its height.
-        label_bbox = day_draw.textbbox((0, 0), week, font=fonts['chinese_forecast'])
-        label_h = label_bbox[3] - label_bbox[1]
-        temp_bbox = day_draw.textbbox((0, 0), max_str, font=fonts['forecast_text'])
-        temp_h = temp_bbox[3] - temp_bbox[1]
-        gap = (BOX_HEIGHT - label_h - SMALL_ICON_SIZE - temp_h) // 4
-
-        label_y = gap
-        icon_y = label_y + label_h + gap
-        temp_y = icon_y + SMALL_ICON_SIZE + gap
-
-        day_draw.text((BOX_WIDTH // 2, label_y), week, fill=fill_color, anchor='ma', font=fonts['chinese_forecast'])
-        icon = Image.open(f"{ICON_DIR_SMALL}/{icon_code}.bmp").resize((SMALL_ICON_SIZE, SMALL_ICON_SIZE), Image.LANCZOS)
-        day_img.paste(icon, ((BOX_WIDTH - icon.width) // 2, icon_y))
-        day_draw.text((temp_x, temp_y), max_str, fill=COLOR_RED, font=fonts['forecast_text'])
-        day_draw.text((temp_x + max_tw, temp_y), slash_str, fill=fill_color, font=fonts['forecast_text'])
-        day_draw.text((temp_x + max_tw + slash_tw, temp_y), min_str, fill=COLOR_BLUE, font=fonts['forecast_text'])
-        image.paste(day_img, (LEFT_COL_X + round(i * DAY_COL_WIDTH), 340))
-
-    return image
+        label_y, icon_y, temp_y, temp_x, max_tw, slash_tw = layout_forecast_day(
+            week, max_str, slash_str, min_str, fonts['chinese_forecast'], fonts['forecast_text'], BOX_WIDTH, BOX_HEIGHT)
+
+        draw.text((x + BOX_WIDTH // 2, y + label_y), week, fill=fill_color, anchor='ma', font=fonts['chinese_forecast'])
+        icon = get_frame_icon(ICON_DIR_SMALL, f"{icon_code}.bmp", SMALL_ICON_SIZE, settings)
+        image.paste(icon, (x + (BOX_WIDTH - icon.width) // 2, y + icon_y))
+        draw.text((x + temp_x, y + temp_y), max_str, fill=COLOR_RED, font=fonts['forecast_text'])
+        draw.text((x + temp_x + max_tw, y + temp_y), slash_str, fill=fill_color, font=fonts['forecast_text'])
+        draw.text((x + temp_x + max_tw + slash_tw, y + temp_y), min_str, fill=COLOR_BLUE, font=fonts['forecast_text'])
+
+@functools.lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def layout_forecast_day(week, max_str, slash_str, min_str, label_font, text_font, box_width, box_height):
+    """Box-relative (label_y, icon_y, temp_y, temp_x, max width, slash width) for one 7-day cell."""
+    max_tw = text_length(max_str, text_font)
+    slash_tw = text_length(slash_str, text_font)
+    min_tw = text_length(min_str, text_font)
+    temp_x = (box_width - max_tw - slash_tw - min_tw) // 2
+
+    # Evenly space the week label, icon, and temp row across the box now that the
+    # range bar is gone, instead of the old fixed y-offsets that assumed its height.
+    label_bbox = text_bbox(week, label_font)
+    label_h = label_bbox[3] - label_bbox[1]
+    temp_bbox = text_bbox(max_str, text_font)
+    temp_h = temp_bbox[3] - temp_bbox[1]
+    gap = (box_height - label_h - SMALL_ICON_SIZE - temp_h) // 4
+
+    label_y = gap
+    icon_y = label_y + label_h + gap
+    temp_y = icon_y + SMALL_ICON_SIZE + gap
+    return label_y, icon_y, temp_y, temp_x, max_tw, slash_tw
+
+# Dynamic panels: name -> (box, panel inputs, fetch_data() sources, draw function). The
+# boxes tile the whole frame without overlapping, so each cached crop can be pasted back
+# independently. A panel gets a staleness marker when any of its sources is stale.
+PANELS = {
+    'title': ((0, 0, DISPLAY_WIDTH, 57), ('warnsum_items', 'warning_codes', 'today_title', 'last_update_text', 'temp_trend'), (), draw_title_panel),
+    'hero': ((0, 57, DIVIDER_X, 212), ('warnsum_items', 'warning_codes', 'current_weather_icon', 'current_temp', 'max_temp', 'min_temp', 'feels_like'),
+             ('local_weather', 'openweathermap'), draw_hero_panel),
+    'alert': ((0, 212, DIVIDER_X, 332), ('warnsum_items', 'warninfo_items', 'warning_codes'),
+              ('warning_summary', 'warning_info', 'special_weather'), draw_alert_panel),
+    'tiles': ((DIVIDER_X, 57, DISPLAY_WIDTH, 238), ('sunset', 'sunrise', 'wind_dir', 'wind_speed', 'current_humidity'),
+              ('srs', 'openweathermap', 'local_weather'), draw_tiles_panel),
+    'forecast': ((DIVIDER_X, 238, DISPLAY_WIDTH, 332), ('forecast_period', 'forecast_description'), ('local_forecast',), draw_forecast_panel),
+    'seven_day': ((0, 332, DISPLAY_WIDTH, DISPLAY_HEIGHT), ('seven_day_forecast',), ('nine_day_forecast',), draw_seven_day_panel),
+}
+# Rendered layers from the previous frame: 'static' and each panel name -> (inputs, image)
+_layer_cache = {}
+# Panel buffer for the last converted frame: 'key' -> (frame digest, mode, dither), 'buffer'
+_buffer_cache = {}
 
 # Helper funtions
+@functools.lru_cache(maxsize=ICON_CACHE_SIZE)
+def load_icon(icon_dir, filename, size, persist=False):
+    """Return an icon decoded and LANCZOS-scaled to size x size, reused across cycles.
+
+    The assets never change, so each (icon, size) is resampled once and then served from
+    memory. With persist set, the scaled copy is also written under CACHE_DIR/icons so a
+    restart skips the resample too; it is redone if the source file is newer.
+    Callers must treat the returned image as read-only.
+    """
+    source_path = os.path.join(icon_dir, filename)
+    atlas_path = os.path.join(CACHE_DIR, 'icons', str(size), f"{os.path.basename(os.path.normpath(icon_dir))}_{os.path.splitext(filename)[0]}.png")
+    if persist:
+        try:
+            if os.path.getmtime(atlas_path) >= os.path.getmtime(source_path):
+                with Image.open(atlas_path) as cached:
+                    return cached.copy()
+        except OSError:
+            pass  # not persisted yet - fall through and build it
+
+    with Image.open(source_path) as source:
+        icon = source.resize((size, size), Image.LANCZOS)
+    if persist:
+        try:
+            os.makedirs(os.path.dirname(atlas_path), exist_ok=True)
+            icon.save(atlas_path)
+        except OSError:
+            logger.warning(f"Could not persist scaled icon {atlas_path}", exc_info=True)
+    return icon
+
+def get_frame_icon(icon_dir, filename, size, settings):
+    """The icon in the frame's own mode: load_icon() for RGB frames, load_palette_icon() for palette frames."""
+    if settings['render_mode'] == 'palette':
+        return load_palette_icon(icon_dir, filename, size, settings['icon_atlas'], settings['dither'])
+    return load_icon(icon_dir, filename, size, settings['icon_atlas'])
+
+@functools.lru_cache(maxsize=ICON_CACHE_SIZE)
+def load_palette_icon(icon_dir, filename, size, persist=False, dither=True):
+    """load_icon() quantized to PANEL_PALETTE once, so pasting it into a palette frame
+    copies panel indices straight in. Callers must treat it as read-only."""
+    return load_icon(icon_dir, filename, size, persist).quantize(
+        palette=get_panel_palette_image(), dither=Image.Dither.FLOYDSTEINBERG if dither else Image.Dither.NONE)
+
+def new_frame_image(settings):
+    """Blank white frame: RGB, or with render_mode = palette a 'P' image whose indices are
+    the panel's own colour indices (1 byte per pixel instead of 3)."""
+    if settings['render_mode'] == 'palette':
+        image = Image.new('P', (DISPLAY_WIDTH, DISPLAY_HEIGHT), PANEL_PALETTE.index(COLOR_WHITE))
+        image.putpalette(get_panel_palette_image().getpalette())
+        return image
+    return Image.new('RGB', (DISPLAY_WIDTH, DISPLAY_HEIGHT), 'white')
+
+# Text measurement, memoized per (text, font) - CJK shaping makes these calls costly and
+# most of the strings (labels, units, ' / ') are identical every frame. Measured on a
+# scratch RGB canvas so results match draw.textlength()/textbbox() on the frame exactly.
+_measure_draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
+@functools.lru_cache(maxsize=TEXT_MEASURE_CACHE_SIZE)
+def text_length(text, font):
+    return _measure_draw.textlength(text, font=font)
+
+@functools.lru_cache(maxsize=TEXT_MEASURE_CACHE_SIZE)
+def text_bbox(text, font):
+    return _measure_draw.textbbox((0, 0), text, font=font)
+
+@functools.lru_cache(maxsize=TEXT_MEASURE_CACHE_SIZE)
+def multiline_text_bbox(text, font, spacing=4):
+    return _measure_draw.multiline_textbbox((0, 0), text, font=font, spacing=spacing)
+
 def align_warnsum_items(warnsum_items, total_width=80):
     values = list(warnsum_items.values())
 
@@ -407,61 +1624,130 @@ def process_warning_items(items):
     
     return result
 
-def wrap_and_truncate(lines, wrap_width, max_lines):
-    """Wrap text lines and cap to max_lines, adding an ellipsis to a truncated last line."""
+def wrap_and_truncate(lines, font, max_width, max_lines):
+    """Wrap text lines to max_width pixels in font and cap to max_lines, ending a truncated
+    last line with an ellipsis. Each line starts a new paragraph."""
     wrapped = []
     for line in lines:
-        wrapped.extend(textwrap.wrap(line, width=wrap_width))
+        wrapped.extend(wrap_to_width(' '.join(line.split()), font, max_width))
+        if len(wrapped) > max_lines:
+            break
     if len(wrapped) > max_lines:
         wrapped = wrapped[:max_lines]
         last_line = wrapped[-1]
-        threshold = wrap_width - 3  # leave space for ellipsis
-        if len(last_line) >= threshold:
-            wrapped[-1] = last_line[:threshold] + '…'
+        widths = prefix_widths(last_line, font)
+        fits = bisect.bisect_right(widths, max_width - glyph_advance('…', font)) - 1
+        wrapped[-1] = last_line[:fits].rstrip() + '…'
     return wrapped
 
-def get_badge_color(label):
-    """Map a warning label to a badge color by severity keyword."""
-    if label == NO_WARNINGS_LABEL:
-        return COLOR_GREEN
-    if any(keyword in label for keyword in WARNING_BADGE_BLACK_KEYWORDS):
-        return COLOR_BLACK
-    if any(keyword in label for keyword in WARNING_BADGE_RED_KEYWORDS):
-        return COLOR_RED
-    if any(keyword in label for keyword in WARNING_BADGE_YELLOW_KEYWORDS):
-        return COLOR_YELLOW
-    return COLOR_BLUE
-
-def get_overall_warning_color(warnsum_items):
+def wrap_to_width(text, font, max_width):
+    """Break text into lines no wider than max_width pixels.
+
+    CJK text can break between any two characters, so break points come from a binary
+    search over the cumulative glyph widths rather than whitespace. Latin words and numbers
+    are kept whole where a space allows, and closing punctuation never starts a line.
+    """
+    widths = prefix_widths(text, font)
+    lines = []
+    start = 0
+    while start < len(text):
+        end = bisect.bisect_right(widths, widths[start] + max_width, lo=start + 1) - 1
+        end = max(end, start + 1)  # a single glyph wider than the column still has to go somewhere
+        if end < len(text):
+            if text[end] in NO_LINE_START_CHARS and end - 1 > start:
+                end -= 1  # carry the preceding character over with the punctuation
+            if is_word_char(text[end - 1]) and is_word_char(text[end]):
+                space = text.rfind(' ', start, end)
+                if space > start:
+                    end = space
+        lines.append(text[start:end].rstrip())
+        start = end
+        while start < len(text) and text[start] == ' ':
+            start += 1
+    return lines
+
+def prefix_widths(text, font):
+    """widths[i] is the pixel width of text[:i], from cached per-glyph advances."""
+    return list(itertools.accumulate((glyph_advance(char, font) for char in text), initial=0))
+
+@functools.lru_cache(maxsize=GLYPH_CACHE_SIZE)
+def glyph_advance(char, font):
+    return _measure_draw.textlength(char, font=font)
+
+def is_word_char(char):
+    return char.isascii() and char.isalnum()
+
+def lookup_warning(label, code=None):
+    """(badge color, hero icon or None) of a warning: by its warnsum code, then by label,
+    then by severity keyword."""
+    entry = WARNING_CODE_INDEX.get(code) or WARNING_LABEL_INDEX.get(label)
+    return entry if entry else (classify_warning_label(label), None)
+
+def get_badge_color(label, code=None):
+    """Map a warning to its badge color."""
+    return lookup_warning(label, code)[0]
+
+@functools.lru_cache(maxsize=256)
+def classify_warning_label(label):
+    """Badge color by severity keyword, for a label the catalogue doesn't know."""
+    return next((color for color, pattern in WARNING_KEYWORD_PATTERNS if pattern.search(label)), COLOR_BLUE)
+
+def get_warning_icon(warnsum_items, warning_codes=None):
+    """Hero icon of the first active warning that has one, or None."""
+    warning_codes = warning_codes or {}
+    return next((icon for icon in (lookup_warning(label, warning_codes.get(label))[1] for label in warnsum_items.values())
+                 if icon), None)
+
+def get_overall_warning_color(warnsum_items, warning_codes=None):
     """Title bar color: the most severe badge colour present, green when nothing is active."""
-    colors = [get_badge_color(label) for label in warnsum_items.values()]
-    return next((c for c in (COLOR_BLACK, COLOR_RED, COLOR_YELLOW, COLOR_BLUE) if c in colors),
-                COLOR_GREEN)
+    warning_codes = warning_codes or {}
+    colors = {get_badge_color(label, warning_codes.get(label)) for label in warnsum_items.values()}
+    return next((c for c in WARNING_SEVERITY_ORDER if c in colors), COLOR_GREEN)
+
+def describe_warning_change(old_items, new_items, warning_codes=None):
+    """Summarise how the warning labels changed (added/removed/escalated), or '' if they didn't.
+    warning_codes maps labels of either side to their warnsum codes."""
+    old_labels, new_labels = set(old_items.values()), set(new_items.values())
+    changes = []
+    if new_labels - old_labels:
+        changes.append(f"added {', '.join(sorted(new_labels - old_labels))}")
+    if old_labels - new_labels:
+        changes.append(f"removed {', '.join(sorted(old_labels - new_labels))}")
+    old_rank = WARNING_SEVERITY_ORDER.index(get_overall_warning_color(old_items, warning_codes))
+    new_rank = WARNING_SEVERITY_ORDER.index(get_overall_warning_color(new_items, warning_codes))
+    if new_rank < old_rank:
+        changes.append('escalated')
+    return '; '.join(changes)
+
+def draw_stale_marker(draw, box, radius=4):
+    """Small red dot in a panel's top-right corner: this panel is showing last-known-good data."""
+    x, y = box[2] - 10, box[1] + 8
+    draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=COLOR_RED)
 
 def draw_pill_badge(draw, x, y, text, font, bg_color, pad_x=10, pad_y=4):
     """Draw a single rounded pill badge and return its (width, height)."""
     # Black text on yellow for contrast (matches HKO's own warning color convention); white
     # elsewhere - including green, which reads better as white on the actual panel.
     text_color = COLOR_BLACK if bg_color == COLOR_YELLOW else COLOR_WHITE
-    bbox = draw.textbbox((0, 0), text, font=font)
+    bbox = text_bbox(text, font)
     width = (bbox[2] - bbox[0]) + pad_x * 2
     height = (bbox[3] - bbox[1]) + pad_y * 2
     draw.rounded_rectangle([x, y, x + width, y + height], radius=height // 2, fill=bg_color)
     draw.text((x + pad_x - bbox[0], y + pad_y - bbox[1]), text, font=font, fill=text_color)
     return width, height
 
-def draw_warning_badges(draw, items, font, start_x, start_y, max_width, gap=6, line_gap=6):
+def draw_warning_badges(draw, items, warning_codes, font, start_x, start_y, max_width, gap=6, line_gap=6):
     """Draw warning items as colored pill badges, wrapping to a new row if needed. Returns bottom y."""
     x, y, row_height = start_x, start_y, 0
     for key in sorted(items.keys()):
         text = items[key]
-        bbox = draw.textbbox((0, 0), text, font=font)
+        bbox = text_bbox(text, font)
         badge_width = (bbox[2] - bbox[0]) + 20
         if x != start_x and x + badge_width > start_x + max_width:
             x = start_x
             y += row_height + line_gap
             row_height = 0
-        badge_w, badge_h = draw_pill_badge(draw, x, y, text, font, get_badge_color(text))
+        badge_w, badge_h = draw_pill_badge(draw, x, y, text, font, get_badge_color(text, warning_codes.get(text)))
         x += badge_w + gap
         row_height = max(row_height, badge_h)
     return y + row_height
@@ -492,11 +1778,15 @@ def process_warning_data(warnsum_json, warninginfo_json, swt_json):
     combined_items.sort(key=lambda x: x['updateTime'], reverse=True)
     latest_items = combined_items[:3]
 
-    # Step 3: Prepare warnsum_items
+    # Step 3: Prepare warnsum_items, and each label's warnsum subtype code for classification
     warnsum_items = {}
     warninfo_items = {}
+    warning_codes = {}
 
-    details_list = warninginfo_json.get('details', [])
+    # warningStatementCode -> contents, keeping the first detail per code
+    details_by_code = {}
+    for detail in warninginfo_json.get('details', []):
+        details_by_code.setdefault(detail.get('warningStatementCode'), detail.get('contents', []))
 
     for i, item in enumerate(latest_items, 1):
         if item['source'] == 'warnsum':
@@ -511,50 +1801,366 @@ def process_warning_data(warnsum_json, warninginfo_json, swt_json):
             else:
                 label = val['name']
             warnsum_items[str(i)] = label
+            warning_codes[label] = val.get('code', code)
 
             # Build warninfo_items
-            for detail in details_list:
-                if detail.get('warningStatementCode') == code:
-                    warninfo_items[str(i)] = detail.get('contents', [])
-                    break
-            else:
-                warninfo_items[str(i)] = ["No detailed info found."]
+            warninfo_items[str(i)] = details_by_code.get(code, ["No detailed info found."])
 
         else:  # source == 'swt'
             warnsum_items[str(i)] = '特別天氣提示'
+            warning_codes['特別天氣提示'] = 'SWT'
             desc_text = item['data'].get('desc', '')
             if desc_text:
                 warninfo_items[str(i)] = [desc_text]
             else:
                 warninfo_items[str(i)] = ["特別天氣提示"]
 
-    return warnsum_items, warninfo_items
-
-def get_hko(data_type,language):
-    current_year = datetime.now().year
+    return warnsum_items, warninfo_items, warning_codes
+
+def timed_call(func, *args):
+    """Call func(*args) and return (result, elapsed seconds)."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def get_hko(data_type, language, ttl=0, timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)):
+    return cached_get_json(get_hko_url(data_type, language), ttl, timeout)
+
+def get_openweathermap(openweather_api_key, location, ttl=0, timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)):
+    return cached_get_json(get_openweathermap_url(openweather_api_key, location), ttl, timeout)
+
+def get_hko_url(data_type, language):
+    return f"https://data.weather.gov.hk/weatherAPI/opendata/weather.php?dataType={data_type}&lang={language}"
+
+# Sunrise/Sunset
+# Per-year tables, compact and complete - the SRS payload is only ever downloaded once a year
+SUN_TABLE_FILE = 'srs_{year}.bin'
+SUN_TABLE_DAYS = 366
+SUN_TABLE_MISSING = 0xFFFF
+# One SRS row: ["YYYY-MM-DD","RISE","TRAN.","SET"]
+SRS_ROW_PATTERN = re.compile(rb'\[\s*"(\d{4})-(\d{2})-(\d{2})"\s*,\s*"(\d{2}):(\d{2})"\s*,\s*"[^"]*"\s*,\s*"(\d{2}):(\d{2})"\s*\]')
+SUN_TABLE_RETRY_SECONDS = 6 * 3600  # before downloading a payload that was missing days again
+# Loaded tables by year; only the current year's is normally held
+_sun_tables = {}
+# An incomplete table -> (table, time.monotonic() it was downloaded), used until a retry is due
+_partial_sun_tables = {}
+
+class SunTable:
+    """A year's sunrise/sunset times as minutes after midnight, indexed by day of year."""
+
+    def __init__(self, year, sunrise=None, sunset=None):
+        self.year = year
+        self.sunrise = sunrise or array('H', [SUN_TABLE_MISSING]) * SUN_TABLE_DAYS
+        self.sunset = sunset or array('H', [SUN_TABLE_MISSING]) * SUN_TABLE_DAYS
+
+    def is_complete(self):
+        days = 366 if self.year % 4 == 0 and (self.year % 100 != 0 or self.year % 400 == 0) else 365
+        return SUN_TABLE_MISSING not in self.sunrise[:days] and SUN_TABLE_MISSING not in self.sunset[:days]
+
+    def times(self, day):
+        """('HH:MM' sunrise, 'HH:MM' sunset) for a date in this year, or ('', '') if unknown."""
+        index = day.timetuple().tm_yday - 1
+        if day.year != self.year or self.sunrise[index] == SUN_TABLE_MISSING:
+            return '', ''
+        return tuple(f"{minutes // 60:02d}:{minutes % 60:02d}" for minutes in (self.sunrise[index], self.sunset[index]))
+
+def get_sun_table(year, timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)):
+    """The SunTable for year, from memory, then CACHE_DIR, and only then the SRS API."""
+    table = _sun_tables.get(year) or load_sun_table(year)
+    if table is None:
+        partial = _partial_sun_tables.get(year)
+        if partial and time.monotonic() - partial[1] < SUN_TABLE_RETRY_SECONDS:
+            return partial[0]
+        table = parse_srs_stream(year, stream_srs_payload(year, timeout))
+        if table.is_complete():
+            save_sun_table(table)
+        else:
+            _partial_sun_tables.clear()
+            _partial_sun_tables[year] = (table, time.monotonic())
+            logger.warning(f"SRS payload for {year} is missing days; it will be fetched again in {SUN_TABLE_RETRY_SECONDS // 3600} hours.")
+    if table.is_complete():
+        _sun_tables.clear()  # a new year has rolled over - drop the old one
+        _partial_sun_tables.clear()
+        _sun_tables[year] = table
+    return table
+
+def stream_srs_payload(year, timeout):
+    """Yield the yearly SRS payload in chunks as it downloads, without building the JSON tree."""
+    with http_session.get(get_srs_url(year), stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            raise Exception(f"Cannot get weather information: {response.status_code} {response.reason}")
+        yield from response.iter_content(chunk_size=16384)
+
+def parse_srs_stream(year, chunks):
+    """Fill a SunTable from SRS payload chunks. Only the unmatched tail of the text seen so
+    far is kept between chunks, so memory stays at a chunk plus the table."""
+    table = SunTable(year)
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        end = 0
+        for match in SRS_ROW_PATTERN.finditer(pending):
+            row_year, month, day, rise_h, rise_m, set_h, set_m = map(int, match.groups())
+            end = match.end()
+            if row_year != year:
+                continue
+            index = datetime(row_year, month, day).timetuple().tm_yday - 1
+            table.sunrise[index] = rise_h * 60 + rise_m
+            table.sunset[index] = set_h * 60 + set_m
+        pending = pending[max(end, len(pending) - 128):]  # a row never spans more than this
+    return table
+
+def get_srs_url(year):
+    return f"https://data.weather.gov.hk/weatherAPI/opendata/opendata.php?dataType=SRS&year={year}&rformat=json"
+
+def load_sun_table(year):
+    try:
+        with open(os.path.join(CACHE_DIR, SUN_TABLE_FILE.format(year=year)), 'rb') as file:
+            packed = file.read()
+    except OSError:
+        return None
+    if len(packed) != 2 * SUN_TABLE_DAYS * array('H').itemsize:
+        return None
+    sunrise, sunset = array('H'), array('H')
+    sunrise.frombytes(packed[:len(packed) // 2])
+    sunset.frombytes(packed[len(packed) // 2:])
+    table = SunTable(year, sunrise, sunset)
+    return table if table.is_complete() else None
+
+def save_sun_table(table):
+    path = os.path.join(CACHE_DIR, SUN_TABLE_FILE.format(year=table.year))
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=CACHE_DIR, suffix='.tmp', delete=False) as file:
+            file.write(table.sunrise.tobytes() + table.sunset.tobytes())
+        os.replace(file.name, path)
+    except OSError:
+        logger.warning(f"Could not write sunrise/sunset table {path}", exc_info=True)
+
+def get_openweathermap_url(openweather_api_key, location):
+    return f"http://api.openweathermap.org/data/2.5/weather?q={location}&appid={openweather_api_key}&units=metric"
+
+def get_source_url(data_type, settings):
+    """URL of the cached response for a FETCH_SOURCES dataType under these settings, or
+    None for SRS, which is kept as a SunTable rather than in the response cache."""
     if data_type == 'SRS':
-        url = f"https://data.weather.gov.hk/weatherAPI/opendata/opendata.php?dataType={data_type}&year={current_year}&rformat=json"
-    else:
-        url = f"https://data.weather.gov.hk/weatherAPI/opendata/weather.php?dataType={data_type}&lang={language}"
-    response = requests.get(url)
+        return None
+    if data_type == 'openweathermap':
+        return get_openweathermap_url(settings['openweathermap_apikey'], OPENWEATHERMAP_LOCATION)
+    return get_hko_url(data_type, settings['language'])
+
+def cached_get_json(url, ttl=0, timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)):
+    """GET a JSON API through the on-disk response cache.
+
+    Entries younger than ttl seconds are returned without a request; older ones are
+    revalidated with If-None-Match/If-Modified-Since, so an unchanged dataset costs a 304
+    instead of a full download. The cache lives in CACHE_DIR and survives restarts.
+    timeout is the (connect, read) pair handed to requests - without it a stalled
+    connection would block forever.
+    """
+    path = get_cache_path(url)
+    entry = read_cache_entry(path)
+    if entry and time.time() - entry['fetched_at'] < ttl:
+        return entry['data']
+
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    response = http_session.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and entry:
+        entry['fetched_at'] = time.time()
+        write_cache_entry(path, entry)
+        return entry['data']
+
     data = response.json()
-    # print(data)
-    if response.status_code == 200:
-        return data
-    else:
+    if response.status_code != 200:
         raise Exception(f"Cannot get weather information: {data}")
+    write_cache_entry(path, {
+        'url': url,
+        'fetched_at': time.time(),
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'data': data
+    })
+    return data
 
-def get_openweathermap(openweather_api_key,location):
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={location}&appid={openweather_api_key}&units=metric"
-    response = requests.get(url)
-    data = response.json()
-    if response.status_code == 200:
-        return data
-        # temperature = data["main"]["temp"]
-        # condition = data["weather"][0]["description"]
-        # print(f"Current temperature in {CITY}: {temperature}°C, {condition}")
+def get_cache_path(url):
+    # Hashed so the OpenWeatherMap API key never ends up in a file name
+    return os.path.join(CACHE_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+def read_cache_entry(path):
+    """Return the cached entry at path, or None if it is missing or unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logger.warning(f"Ignoring unreadable cache entry {path}")
+        return None
+
+def write_cache_entry(path, entry):
+    """Atomically replace the cache entry at path, so a crash mid-write never leaves a torn file."""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=CACHE_DIR, suffix='.tmp', delete=False) as file:
+            json.dump(entry, file, ensure_ascii=False)
+        os.replace(file.name, path)
+    except OSError:
+        logger.warning(f"Could not write cache entry {path}", exc_info=True)
+
+def get_panel_buffer(epd, image, dither=True):
+    """Packed framebuffer for epd.display(), cached for the most recently converted frame.
+
+    Uses pack_panel_buffer() when NumPy is available, otherwise Waveshare's getbuffer().
+    """
+    frame_key = (hashlib.sha1(image.tobytes()).digest(), image.mode, dither)
+    if _buffer_cache.get('key') != frame_key:
+        buffer = pack_panel_buffer(image, dither) if np is not None else epd.getbuffer(image)
+        _buffer_cache.update(key=frame_key, buffer=buffer)
+    return _buffer_cache['buffer']
+
+def pack_panel_buffer(image, dither=True):
+    """Convert a frame to the epd7in3e's 4bpp buffer (two pixels per byte) with NumPy.
+
+    With dither, quantizing is PIL's Floyd-Steinberg against PANEL_PALETTE - the same step
+    getbuffer() does, so the bytes match it exactly; only the per-byte Python packing loop
+    is replaced. Without dither, each pixel maps straight to its palette index and only the
+    antialiased edge pixels fall back to the nearest palette colour. Either way, frames in
+    the dashboard's flat colours come out byte-identical to getbuffer(). A palette-mode
+    frame already holds panel indices, so it is packed as is and dither doesn't apply.
+    """
+    if image.mode == 'P':
+        indices = np.asarray(image)
+    elif dither:
+        indices = np.asarray(image.convert('RGB').quantize(palette=get_panel_palette_image(),
+                                                            dither=Image.Dither.FLOYDSTEINBERG))
     else:
-        raise Exception(f"Cannot get weather information: {data}")
+        rgb = np.asarray(image.convert('RGB'), dtype=np.uint32)
+        keys = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+        palette = np.array(PANEL_PALETTE[:4] + PANEL_PALETTE[5:], dtype=np.int32)
+        palette_indices = np.array([0, 1, 2, 3, 5, 6], dtype=np.uint8)
+        palette_keys = (palette[:, 0] << 16) | (palette[:, 1] << 8) | palette[:, 2]
+        order = np.argsort(palette_keys)
+        position = np.searchsorted(palette_keys[order], keys).clip(max=len(order) - 1)
+        exact = palette_keys[order][position] == keys
+        indices = palette_indices[order][position]
+        if not exact.all():
+            off_palette = rgb[~exact].astype(np.int32)
+            distance = ((off_palette[:, None, :] - palette[None, :, :]) ** 2).sum(axis=2)
+            indices[~exact] = palette_indices[distance.argmin(axis=1)]
+    flat = indices.astype(np.uint8).ravel()
+    return ((flat[0::2] << 4) | flat[1::2]).tobytes()
+
+@functools.lru_cache(maxsize=1)
+def get_panel_palette_image():
+    palette_image = Image.new('P', (1, 1))
+    palette_image.putpalette([channel for color in PANEL_PALETTE for channel in color] + [0, 0, 0] * (256 - len(PANEL_PALETTE)))
+    return palette_image
+
+# Boot Frame
+# The last frame sent to the panel, kept in CACHE_DIR so a restart can put it straight back
+BOOT_FRAME_FILE = 'last_frame.bin'
+BOOT_STATE_FILE = 'last_frame.json'
+
+def save_boot_frame(panel_buffer, processed_data, fingerprint):
+    """Persist the packed frame just displayed, with the data and fingerprint it came from."""
+    frame_path = os.path.join(CACHE_DIR, BOOT_FRAME_FILE)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=CACHE_DIR, suffix='.tmp', delete=False) as file:
+            file.write(bytes(panel_buffer))
+        os.replace(file.name, frame_path)
+    except OSError:
+        logger.warning(f"Could not write boot frame {frame_path}", exc_info=True)
+        return
+    # default=str as in fingerprint_data(); the state file is written second, so it never
+    # describes a frame that did not make it to disk
+    write_cache_entry(os.path.join(CACHE_DIR, BOOT_STATE_FILE), {
+        'fingerprint': fingerprint,
+        'frame_sha1': hashlib.sha1(bytes(panel_buffer)).hexdigest(),
+        'on_panel': True,
+        'saved_at': time.time(),
+        'data': json.loads(json.dumps(processed_data, ensure_ascii=False, default=str)),
+    })
+
+def load_boot_frame():
+    """Return (state, packed frame) from the last run, or None if there is no usable frame."""
+    state = read_cache_entry(os.path.join(CACHE_DIR, BOOT_STATE_FILE))
+    if state is None:
+        return None
+    try:
+        with open(os.path.join(CACHE_DIR, BOOT_FRAME_FILE), 'rb') as file:
+            frame = file.read()
+    except OSError:
+        return None
+    if len(frame) != DISPLAY_WIDTH * DISPLAY_HEIGHT // 2 or hashlib.sha1(frame).hexdigest() != state.get('frame_sha1'):
+        logger.warning('Ignoring boot frame that does not match its saved state.')
+        return None
+    return state, frame
+
+def restore_boot_frame(epd):
+    """Put the saved frame back on a just-initialized panel, or clear it if there is none.
+    Returns the saved state, or None."""
+    boot_frame = load_boot_frame()
+    if boot_frame is None:
+        logger.info('Clearing e-Ink screen...')
+        epd.Clear()
+        return None
+    boot_state, frame = boot_frame
+    if boot_state['on_panel']:
+        logger.info('e-Ink screen still shows the last frame, leaving it up.')
+    else:
+        logger.info('Restoring the last frame to the e-Ink screen...')
+        epd.display(frame)
+        boot_state['on_panel'] = True
+        write_cache_entry(os.path.join(CACHE_DIR, BOOT_STATE_FILE), boot_state)
+    return boot_state
+
+def mark_boot_frame_cleared():
+    """Record that the panel was cleared, so the next boot pushes the frame instead of assuming it is shown."""
+    state_path = os.path.join(CACHE_DIR, BOOT_STATE_FILE)
+    state = read_cache_entry(state_path)
+    if state is not None:
+        state['on_panel'] = False
+        write_cache_entry(state_path, state)
+
+def warm_up(fonts, settings, data=None):
+    """Open the font faces the frame uses, pre-scale the icons the next frame is likely to
+    need and connect to the APIs, so the first real refresh doesn't pay for any of it."""
+    start = time.perf_counter()
+    for key in FRAME_FONT_KEYS:
+        fonts[key]
+    for icon_file, *_ in WEATHER_TILES:
+        get_frame_icon(ICON_DIR_SMALL, icon_file, SMALL_ICON_SIZE, settings)
+    if data:
+        get_frame_icon(ICON_DIR_LARGE, f"{data['current_weather_icon']}.bmp", HERO_ICON_SIZE, settings)
+        for day in data['seven_day_forecast']:
+            get_frame_icon(ICON_DIR_SMALL, f"{day['ForecastIcon']}.bmp", SMALL_ICON_SIZE, settings)
+    for url in ('https://data.weather.gov.hk/', 'http://api.openweathermap.org/'):
+        try:
+            http_session.head(url, timeout=settings['timeouts']['rhrread'])
+        except requests.RequestException:
+            pass  # the first fetch will report it properly
+    logger.info(f"Warm-up finished in {time.perf_counter() - start:.2f}s.")
+
+# Settings that change how the same data is drawn, so a hot-reloaded edit to any of them
+# redraws the panel instead of waiting for the data to change
+RENDER_SETTINGS = sorted(FONT_SETTINGS | {'max_lines', 'render_mode', 'dither', 'icon_atlas'})
+
+def fingerprint_data(data, settings):
+    """Hash everything draw_screen() renders from, so an unchanged dashboard hashes the same.
+
+    The only clock on the frame that matters is the date in the title bar; the minute-level
+    最後更新 stamp is left out, otherwise every cycle would look like a change. RENDER_VERSION
+    is in too, so frames drawn by older code are not mistaken for current ones.
+    """
+    render_settings = {key: settings[key] for key in RENDER_SETTINGS}
+    payload = json.dumps([RENDER_VERSION, datetime.now().strftime('%Y-%m-%d'), render_settings, data],
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
 
 def deg_to_compass(deg):
     directions = [
@@ -565,49 +2171,242 @@ def deg_to_compass(deg):
     return directions[idx]
 
 # Main loop
+# Profiling
+PROFILE_SAMPLE_SECONDS = 0.005
+PROFILE_TOP_N = 30
+
+def profile_cycles(settings, fonts, pipeline, cycles, profile_dir):
+    """--profile: run refresh cycles back to back under cProfile, tracemalloc and a stack
+    sampler, writing for each cycle N into profile_dir:
+
+        cycle-NN.prof       cProfile data, for pstats or snakeviz
+        cycle-NN.txt        stage timings, top functions by cumulative time, top allocation sites
+        cycle-NN.collapsed  sampled stacks of every thread, for flamegraph.pl or speedscope
+
+    The pipeline's stages run inline on this thread so cProfile sees them, and render
+    caches are cleared first so every cycle draws and packs a full frame. In DEV mode the
+    frame is saved beside the profiles instead of being shown. None of this is imported or
+    hooked in unless --profile is given.
+    """
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    os.makedirs(profile_dir, exist_ok=True)
+    tracemalloc.start()
+    try:
+        for number in range(1, cycles + 1):
+            prefix = os.path.join(profile_dir, f"cycle-{number:02d}")
+            cycle = new_cycle_metrics()
+            _layer_cache.clear()
+            _buffer_cache.clear()
+            pipeline.rendered_fingerprint = None
+            tracemalloc.clear_traces()  # also zeroes the traced peak, so each cycle reports its own
+            sampler = StackSampler()
+            sampler.start()
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                with stage_timer(cycle, 'fetch_data'):
+                    raw_data = fetch_data(settings, cycle)
+                frame = pipeline.render({'cycle': cycle, 'settings': settings, 'fonts': fonts, 'raw': raw_data})
+                if pipeline.epd:
+                    pipeline.display(frame)
+                else:
+                    frame['image'].save(f"{prefix}.png")
+                    pipeline.metrics.record(cycle)
+            except Exception:
+                logger.exception(f"Profiled cycle {number} failed:")
+                frame = None
+            finally:
+                profiler.disable()
+                sampler.stop()
+            # Taken while the frame is still referenced, so its buffers show among the sites
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            peak = tracemalloc.get_traced_memory()[1]
+
+            profiler.dump_stats(f"{prefix}.prof")
+            with open(f"{prefix}.txt", 'w', encoding='utf-8') as file:
+                file.write(f"Cycle {number}\n")
+                for stage, seconds in cycle['stages'].items():
+                    file.write(f"  {stage:<14}{seconds * 1000:10.1f} ms\n")
+                file.write(f"  traced peak {peak / 1024:10.0f} KiB\n\n")
+                pstats.Stats(profiler, stream=file).sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+                file.write(f"Top {PROFILE_TOP_N} allocation sites still live at the end of the cycle:\n")
+                for statistic in snapshot.statistics('lineno')[:PROFILE_TOP_N]:
+                    file.write(f"  {statistic}\n")
+            sampler.write_collapsed(f"{prefix}.collapsed")
+            logger.info(f"Profiled cycle {number}/{cycles}, written to {prefix}.*")
+            del frame
+    finally:
+        tracemalloc.stop()
+
+class StackSampler(threading.Thread):
+    """Samples the Python stack of every other thread at a fixed interval and counts each
+    distinct stack, rooted at the thread name - the collapsed-stack format flame graph
+    tools read. Catches the fetch workers that cProfile, tracing one thread, cannot."""
+
+    def __init__(self, interval=PROFILE_SAMPLE_SECONDS):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.interval = interval
+        self.counts = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, str(ident)))
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in sorted(self.counts.items()):
+                file.write(f"{stack} {count}\n")
+
+def apply_config_change(settings, fonts, scheduler, pipeline, warning_watcher, wake_event):
+    """Switch the running dashboard to an edited settings.ini, rebuilding only what the
+    changed keys affect. The panel stays up; the next cycle renders with the new settings.
+
+    Fonts are re-registered only when a font file changed, and get_font() still holds
+    every unchanged face. Endpoints are cached per URL, so a new language or API key just
+    misses the cache for the URLs it changes. The warning watcher is restarted when its
+    settings change. Metrics, the observation store and the SERVER/CLIENT settings are read
+    once at start-up and need a restart.
+    """
+    new_settings, changed = reload_config(settings)
+    if not changed:
+        return settings, fonts, warning_watcher
+    logger.info(f"{CONFIG_FILE} changed ({', '.join(sorted(changed))}), applying it.")
+    if changed & FONT_SETTINGS:
+        fonts = load_fonts(new_settings)
+    scheduler.settings = new_settings
+    if changed & {'language', 'warning_poll_seconds', 'timeouts'}:
+        rendered_items = rendered_info = rendered_codes = None
+        if warning_watcher:
+            warning_watcher.stop()
+            rendered_items, rendered_info, rendered_codes = (warning_watcher.rendered_items, warning_watcher.rendered_info,
+                                                             warning_watcher.rendered_codes)
+        warning_watcher = None
+        if new_settings['warning_poll_seconds'] > 0:
+            warning_watcher = WarningWatcher(new_settings, wake_event)
+            if rendered_items is not None:
+                warning_watcher.set_rendered(rendered_items, rendered_info, rendered_codes)
+            warning_watcher.start()
+        pipeline.warning_watcher = warning_watcher
+    return new_settings, fonts, warning_watcher
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--mode', choices=['DEV', 'PRD'], default='DEV', help='Run mode: DEV or PRD')
+    parser.add_argument('--mode', choices=['DEV', 'PRD', 'SERVER', 'CLIENT'], default='DEV',
+                        help='Run mode: DEV, PRD, SERVER (render for other panels) or CLIENT (display frames from a SERVER)')
+    parser.add_argument('--subset-fonts', action='store_true', help='Build glyph subsets of the CJK fonts and exit')
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+                        help='Profile N refresh cycles (cProfile, tracemalloc, sampled stacks) and exit')
+    parser.add_argument('--profile-dir', default='profiles', help='Where --profile writes its output')
     args = parser.parse_args()
     mode = args.mode.upper()
 
     settings = load_config()
+    if args.subset_fonts:
+        subset_fonts(settings)
+        return
+    if mode == 'SERVER':
+        run_server(settings)
+        return
+    if mode == 'CLIENT':
+        run_client(settings)
+        return
     fonts = load_fonts(settings)
 
     logger.info(f"Application started in {mode} mode.")
 
+    displayed_fingerprint = boot_data = None
+
     if mode == 'PRD':
         from waveshare_epd import epd7in3e
         epd = epd7in3e.EPD()
         logger.info('Initializing e-Ink screen...')
         epd.init()
-        logger.info('Clearing e-Ink screen...')
-        epd.Clear()
+        boot_state = restore_boot_frame(epd)
+        if boot_state:
+            displayed_fingerprint, boot_data = boot_state['fingerprint'], boot_state['data']
         fill_color = epd.BLACK
     else:
         epd = None  # Not used in DEV
         fill_color = 'black'
-
+    if args.profile > 0:
+        try:
+            profile_cycles(settings, fonts, RefreshPipeline(epd, fill_color, MetricsExporter(settings)), args.profile, args.profile_dir)
+        except KeyboardInterrupt:
+            logger.info('Profiling interrupted.')
+        finally:
+            if epd:
+                logger.info('Putting e-Ink screen to sleep...')
+                epd.sleep()
+        return
+    threading.Thread(target=warm_up, args=(fonts, settings, boot_data), name='warm-up', daemon=True).start()
+
+    wake_event = threading.Event()
+    warning_watcher = None
+    if settings['warning_poll_seconds'] > 0:
+        warning_watcher = WarningWatcher(settings, wake_event)
+        if boot_data:
+            warning_watcher.set_rendered(boot_data['warnsum_items'], boot_data['warninfo_items'], boot_data.get('warning_codes'))
+        warning_watcher.start()
+
+    metrics = MetricsExporter(settings)
+    metrics.start()
+    observations = ObservationStore(os.path.join(CACHE_DIR, OBSERVATIONS_FILE), settings['observations_capacity'],
+                                    settings['observations_flush_records'])
+    pipeline = RefreshPipeline(epd, fill_color, metrics, warning_watcher, displayed_fingerprint, observations)
+    pipeline.start()
+    scheduler = RefreshScheduler(settings)
+    sleep_drift = 0.0
+    config_mtime = get_config_mtime()
+
+    # The fetch stage runs here; rendering and panel writes happen on the pipeline's threads
     while True:
+        cycle = new_cycle_metrics(sleep_drift)
+        sleep_drift = 0.0
         try:
+            if get_config_mtime() != config_mtime:
+                config_mtime = get_config_mtime()
+                settings, fonts, warning_watcher = apply_config_change(settings, fonts, scheduler, pipeline,
+                                                                       warning_watcher, wake_event)
             logger.info('Starting refresh cycle...')
-            raw_data = fetch_data(settings)
-            processed_data = process_data(raw_data, settings)
-            screen_image = draw_screen(processed_data, fonts, settings, fill_color)
-
-            if mode == 'PRD':
-                epd.display(epd.getbuffer(screen_image))
+            wake_event.clear()
+            raw_data = fetch_data(settings, cycle, scheduler.due_datasets())
+            scheduler.observe(raw_data)
+            pipeline.submit({'cycle': cycle, 'settings': settings, 'fonts': fonts, 'raw': raw_data})
+            delay = scheduler.next_delay()
+            logger.info(f"Waiting {delay:.0f} seconds...")
+            sleep_start = time.monotonic()
+            if wake_event.wait(delay):
+                logger.info('Woken early by the warning watcher.')
             else:
-                screen_image.show()
-            logger.info('Refresh cycle complete.')
-            logger.info(f"Waiting {settings['refresh_seconds']} seconds...")
-            time.sleep(settings['refresh_seconds'])
+                sleep_drift = time.monotonic() - sleep_start - delay
 
         except KeyboardInterrupt:
-            logger.info("Graceful shutdown requested.")
+            logger.info("Graceful shutdown requested, waiting for the pipeline to drain...")
+            pipeline.shutdown()
+            observations.close()
             if mode == 'PRD' and epd:
                 logger.info('Clearing e-Ink screen before exit...')
                 epd.Clear()
+                mark_boot_frame_cleared()
                 logger.info('Putting e-Ink screen to sleep...')
                 epd.sleep()
             logger.info('Shutdown complete.')
@@ -615,7 +2414,11 @@ def main():
 
         except Exception as e:
             logger.exception("Unexpected error occurred:")
-            time.sleep(60)
+            cycle['failed'] = True
+            metrics.record(cycle)
+            delay = scheduler.failure_delay()
+            logger.info(f"Retrying in {delay:.0f} seconds...")
+            wake_event.wait(delay)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
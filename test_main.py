@@ -0,0 +1,77 @@
+import unittest
+
+import main
+
+'''
+Tests for main.py that need no network, fonts or e-ink panel.
+
+    python -m unittest      # or: python -m pytest
+'''
+
+# Every HKO warnsum subtype code: (badge color, hero icon or None)
+HKO_WARNINGS = {
+    'TC1': (main.COLOR_YELLOW, 'T1.bmp'),
+    'TC3': (main.COLOR_YELLOW, 'T3.bmp'),
+    'WTCPRE8': (main.COLOR_RED, None),
+    'TC8NE': (main.COLOR_RED, 'T8NE.bmp'),
+    'TC8SE': (main.COLOR_RED, 'T8SE.bmp'),
+    'TC8SW': (main.COLOR_RED, 'T8SW.bmp'),
+    'TC8NW': (main.COLOR_RED, 'T8NW.bmp'),
+    'TC9': (main.COLOR_BLACK, 'T9.bmp'),
+    'TC10': (main.COLOR_BLACK, 'T10.bmp'),
+    'WRAINA': (main.COLOR_YELLOW, 'AmberRainstorm.bmp'),
+    'WRAINR': (main.COLOR_RED, 'RedRainstorm.bmp'),
+    'WRAINB': (main.COLOR_BLACK, 'BlackRainstorm.bmp'),
+    'WFIREY': (main.COLOR_YELLOW, None),
+    'WFIRER': (main.COLOR_RED, None),
+    'WFROST': (main.COLOR_BLACK, None),
+    'WTMW': (main.COLOR_RED, None),
+    'WCOLD': (main.COLOR_RED, None),
+    'WHOT': (main.COLOR_BLUE, None),
+    'WMSGNL': (main.COLOR_BLUE, None),
+    'WL': (main.COLOR_BLUE, None),
+    'WFNTSA': (main.COLOR_BLUE, None),
+    'WTS': (main.COLOR_BLUE, None),
+    'SWT': (main.COLOR_BLUE, None),
+}
+
+# English warnsum entries as HKO sends them with lang=en: warnsum key -> entry
+ENGLISH_WARNSUM = {
+    'WTCSGNL': {'name': 'Tropical Cyclone Warning Signal', 'code': 'TC10', 'type': 'Hurricane Signal No. 10'},
+    'WRAIN': {'name': 'Rainstorm Warning Signal', 'code': 'WRAINR', 'type': 'Red'},
+    'WFROST': {'name': 'Frost Warning', 'code': 'WFROST'},
+}
+
+class WarningCatalogueTest(unittest.TestCase):
+    def test_catalogue_covers_every_hko_warning(self):
+        self.assertEqual(set(main.WARNING_CODE_INDEX), set(HKO_WARNINGS))
+
+    def test_classification_by_code(self):
+        for code, expected in HKO_WARNINGS.items():
+            with self.subTest(code=code):
+                self.assertEqual(main.lookup_warning('an unknown label', code), expected)
+
+    def test_classification_by_label_without_code(self):
+        for code, label, color, icon in main.WARNING_CATALOGUE:
+            with self.subTest(label=label):
+                self.assertEqual(main.lookup_warning(label), (color, icon))
+
+    def test_unknown_warning_falls_back_to_keywords(self):
+        self.assertEqual(main.get_badge_color('紅色新警告'), main.COLOR_RED)
+        self.assertEqual(main.get_badge_color('Some new warning'), main.COLOR_BLUE)
+
+    def test_english_warnings_classify_by_code(self):
+        update_time = '2026-10-18T10:00:00+08:00'
+        warnsum = {key: dict(entry, actionCode='ISSUE', issueTime=update_time, updateTime=update_time)
+                   for key, entry in ENGLISH_WARNSUM.items()}
+        warnsum_items, _, warning_codes = main.process_warning_data(warnsum, {'details': []}, {'swt': []})
+        colors = {warning_codes[label]: main.get_badge_color(label, warning_codes[label]) for label in warnsum_items.values()}
+        self.assertEqual(colors, {'TC10': main.COLOR_BLACK, 'WRAINR': main.COLOR_RED, 'WFROST': main.COLOR_BLACK})
+        self.assertEqual(main.get_overall_warning_color(warnsum_items, warning_codes), main.COLOR_BLACK)
+        self.assertEqual(main.get_warning_icon(warnsum_items, warning_codes), 'T10.bmp')
+
+    def test_no_warnings_is_green(self):
+        self.assertEqual(main.get_overall_warning_color({'1': main.NO_WARNINGS_LABEL}), main.COLOR_GREEN)
+
+if __name__ == '__main__':
+    unittest.main()